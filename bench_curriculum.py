@@ -0,0 +1,165 @@
+"""
+Benchmarks for math_curriculum: micro-benchmarks of each generator family and helper, and end-to-end corpus
+throughput across range sizes. Results are printed as a table and can be saved as JSON and compared against a
+saved baseline, e.g.
+
+    python bench_curriculum.py --json baseline.json
+    python bench_curriculum.py --compare baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+import math_curriculum as mc
+
+MACRO_RANGES = (10, 30, 100)
+QUICK_MACRO_RANGES = (10, 30)
+
+
+def bench(name: str, fn: Callable[[], list[str] | object], ops: int, repeat: int) -> dict:
+    """Runs `fn` `repeat` times after one warm-up call and reports the median run of `ops` operations each."""
+    random.seed(0)
+    fn()
+    times = []
+    docs = num_bytes = 0
+    for _ in range(repeat):
+        random.seed(0)
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+        if isinstance(out, list) and out and isinstance(out[0], str):
+            docs, num_bytes = len(out), sum(len(doc.encode()) for doc in out)
+    elapsed = statistics.median(times)
+    return {
+        "name": name,
+        "kind": "micro",
+        "seconds": elapsed,
+        "ops_per_sec": ops / elapsed,
+        "docs_per_sec": docs / elapsed if docs else None,
+        "bytes_per_sec": num_bytes / elapsed if docs else None,
+    }
+
+
+def micro_benchmarks(repeat: int, quick: bool) -> list[dict]:
+    scale = 1 if quick else 5
+    pairs = [(a, b) for a in range(1, 20 * scale) for b in range(1, 20)]
+    pair_rows = mc.pair_arithmetic(pairs)
+
+    def family(examples: Callable[..., list[str]], args: list[tuple]) -> Callable[[], list[str]]:
+        return lambda: [doc for a in args for doc in examples(*a)]
+
+    divisions = [(r.a, r.b, r.ab_quotient, r.ab_remainder, r.ab_float) for r in pair_rows]
+    return [
+        bench("a_plus_b_examples", family(mc.a_plus_b_examples, [(a, b, a + b) for a, b in pairs]), len(pairs), repeat),
+        bench("a_minus_b_examples", family(mc.a_minus_b_examples, [(a, b, a - b) for a, b in pairs]), len(pairs),
+              repeat),
+        bench("a_times_b_examples", family(mc.a_times_b_examples, [(a, b, a * b) for a, b in pairs]), len(pairs),
+              repeat),
+        bench("a_divided_by_b_examples", family(mc.a_divided_by_b_examples, divisions), len(divisions), repeat),
+        bench("examples_from_natural_number", family(mc.examples_from_natural_number, [(n,) for n in range(50 * scale)]),
+              50 * scale, repeat),
+        bench("generate_unique_number_pairs", lambda: mc.generate_unique_number_pairs(10_000 * scale, 0, 1000),
+              10_000 * scale, repeat),
+        bench("is_prime", lambda: [mc.is_prime(n) for n in range(20_000 * scale)], 20_000 * scale, repeat),
+        bench("to_superscript", lambda: [mc.to_superscript(n) for n in range(-5_000 * scale, 5_000 * scale)],
+              10_000 * scale, repeat),
+        bench("to_subscript", lambda: [mc.to_subscript(n) for n in range(-5_000 * scale, 5_000 * scale)],
+              10_000 * scale, repeat),
+    ]
+
+
+def macro_benchmark(upper: int) -> dict:
+    """Generates the deduplicated corpus for numbers 0..upper-1 and every pair in that range, in a fresh process."""
+    random.seed(0)
+    dedup = mc.ExactDedup()
+    docs = num_bytes = 0
+    start = time.perf_counter()
+    for doc in mc.iter_corpus(range(upper), mc.iter_unique_number_pairs(None, 0, upper - 1), dedup=dedup):
+        docs += 1
+        num_bytes += len(doc.encode())
+    elapsed = time.perf_counter() - start
+    total = docs + dedup.num_duplicates
+    return {
+        "name": f"corpus_0..{upper}",
+        "kind": "macro",
+        "seconds": elapsed,
+        "docs": docs,
+        "docs_per_sec": docs / elapsed,
+        "bytes_per_sec": num_bytes / elapsed,
+        "dedup_ratio": dedup.num_duplicates / total if total else 0.0,
+        # ru_maxrss is KiB on Linux and bytes on macOS.
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10),
+    }
+
+
+def macro_benchmarks(ranges: tuple[int, ...], repeat: int) -> list[dict]:
+    results = []
+    for upper in ranges:
+        runs = []
+        for _ in range(repeat):
+            # A fresh process per run keeps peak RSS and warm caches from leaking between runs.
+            with ProcessPoolExecutor(1, max_tasks_per_child=1) as executor:
+                runs.append(executor.submit(macro_benchmark, upper).result())
+        results.append(sorted(runs, key=lambda r: r["seconds"])[len(runs) // 2])
+    return results
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    """Returns a line per benchmark that got more than `threshold` slower than the baseline."""
+    previous = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        if (old := previous.get(result["name"])) is None:
+            continue
+        metric = "docs_per_sec" if result["kind"] == "macro" else "ops_per_sec"
+        change = result[metric] / old[metric] - 1
+        if change < -threshold:
+            regressions.append(f"{result['name']}: {metric} {old[metric]:,.0f} -> {result[metric]:,.0f} ({change:+.1%})")
+    return regressions
+
+
+def print_table(results: list[dict]):
+    print(f"{'benchmark':<32} {'ops/s':>12} {'docs/s':>12} {'MB/s':>8} {'dedup':>7} {'RSS MiB':>8}")
+    for r in results:
+        print(f"{r['name']:<32} "
+              f"{r.get('ops_per_sec') or 0:>12,.0f} "
+              f"{r.get('docs_per_sec') or 0:>12,.0f} "
+              f"{(r.get('bytes_per_sec') or 0) / 1e6:>8.2f} "
+              f"{r['dedup_ratio'] if 'dedup_ratio' in r else '':>7.3} "
+              f"{r['peak_rss_mib'] if 'peak_rss_mib' in r else '':>8.5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown that counts as a regression")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and ranges, for a fast smoke run")
+    parser.add_argument("--only", choices=["micro", "macro"])
+    args = parser.parse_args()
+
+    results = []
+    if args.only != "macro":
+        results += micro_benchmarks(args.repeat, args.quick)
+    if args.only != "micro":
+        results += macro_benchmarks(QUICK_MACRO_RANGES if args.quick else MACRO_RANGES, min(args.repeat, 3))
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results}, f,
+                      indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,269 @@
+"""
+In-memory document storage and indexes: CompactCorpus, a compact exact dedup stage, and CorpusIndex, which maps
+operands, families and templates to document ids.
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional (the fast extra); the id set operations fall back to plain Python without it.
+    np = None
+
+if TYPE_CHECKING:
+    from math_curriculum import DocumentTag
+
+
+class CompactCorpus:
+    """An exact dedup stage that keeps its documents as UTF-8 in one arena, with a hash index of document numbers."""
+    MAGIC = b"CCORPUS1"
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.arena: bytearray | memoryview = bytearray()
+        self.offsets: array | memoryview = array("Q", [0])
+        self.hashes: array | memoryview = array("Q")
+        # Document number + 1 per slot, 0 for empty; kept under half full
+        self.index: array | memoryview = array("I", bytes(4 * (1 << max(capacity - 1, 1).bit_length())))
+        self.num_duplicates = 0
+        self._mmap = None
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, doc: str) -> bool:
+        return self.find(doc) >= 0
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.view(i), "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(view, "utf-8") for view in self.iter_views())
+
+    def add(self, doc: str) -> bool:
+        data = doc.encode()
+        h = _hash_bytes(data)
+        found, slot = self._find(data, h)
+        if found:
+            self.num_duplicates += 1
+            return False
+        if self._mmap is not None:
+            self._materialize()
+            found, slot = self._find(data, h)
+        start = self.offsets[-1]
+        end = start + len(data)
+        if end > len(self.arena):
+            self._grow_arena(end)
+        self.arena[start:end] = data
+        self.offsets.append(end)
+        self.hashes.append(h)
+        self.index[slot] = len(self.hashes)
+        if 2 * len(self.hashes) > len(self.index):
+            self._grow()
+        return True
+
+    def find(self, doc: str) -> int:
+        """Returns the position of `doc` in the corpus, or -1."""
+        data = doc.encode()
+        return self._find(data, _hash_bytes(data))[0] - 1
+
+    def iter_views(self) -> Iterator[memoryview]:
+        """Yields each document's UTF-8 bytes as a zero-copy view."""
+        arena = memoryview(self.arena)
+        offsets = self.offsets
+        for i in range(len(self)):
+            yield arena[offsets[i]:offsets[i + 1]]
+
+    def view(self, i: int) -> memoryview:
+        return memoryview(self.arena)[self.offsets[i]:self.offsets[i + 1]]
+
+    def save(self, path: str):
+        size = self.offsets[-1]
+        header = self.MAGIC + struct.pack("<QQQ", len(self), size, len(self.index))
+        with open(path + ".tmp", "wb") as f:
+            for part in (header, self.offsets, self.hashes, self.index, memoryview(self.arena)[:size]):
+                f.write(part)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "CompactCorpus":
+        corpus = cls.__new__(cls)
+        with open(path, "rb") as f:
+            corpus._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(corpus._mmap)
+        if data[:8] != cls.MAGIC:
+            raise ValueError(f"{path} is not a saved CompactCorpus")
+        num_docs, arena_size, index_size = struct.unpack_from("<QQQ", data, 8)
+        start = 32
+        sections = []
+        for count, typecode in ((num_docs + 1, "Q"), (num_docs, "Q"), (index_size, "I")):
+            size = count * array(typecode).itemsize
+            sections.append(data[start:start + size].cast(typecode))
+            start += size
+        corpus.offsets, corpus.hashes, corpus.index = sections
+        corpus.arena = data[start:start + arena_size]
+        corpus.num_duplicates = 0
+        return corpus
+
+    def _find(self, data: bytes, h: int) -> tuple[int, int]:
+        """Returns (document number + 1 or 0, slot)."""
+        index, hashes, offsets, arena = self.index, self.hashes, self.offsets, self.arena
+        mask = len(index) - 1
+        i = h & mask
+        while (n := index[i]) != 0:
+            if hashes[n - 1] == h and arena[offsets[n - 1]:offsets[n]] == data:
+                return n, i
+            i = (i + 1) & mask
+        return 0, i
+
+    def _grow(self):
+        index = array("I", bytes(8 * len(self.index)))
+        mask = len(index) - 1
+        for n, h in enumerate(self.hashes, 1):
+            i = h & mask
+            while index[i] != 0:
+                i = (i + 1) & mask
+            index[i] = n
+        self.index = index
+
+    def _grow_arena(self, size: int):
+        # Replaced rather than resized, so views into the old arena stay valid (resizing one would raise BufferError)
+        arena = bytearray(max(size, 2 * len(self.arena), 1 << 16))
+        used = self.offsets[-1]
+        arena[:used] = memoryview(self.arena)[:used]
+        self.arena = arena
+
+    def _materialize(self):
+        self.arena = bytearray(self.arena)
+        self.offsets = array("Q", self.offsets)
+        self.hashes = array("Q", self.hashes)
+        self.index = array("I", self.index)
+        self._mmap = None  # Views into the old mapping keep it open until they're released
+
+
+class CorpusIndex:
+    """
+    Document ids by family, template, operand and operand set (both up to sign). Duplicates are posted under the id
+    of the document they repeat.
+    """
+
+    def __init__(self, dedup: bool = True):
+        self.docs = CompactCorpus() if dedup else None
+        self.num_docs = 0
+        self.num_duplicates = 0
+        self.postings: dict[tuple, array] = {}
+
+    def add(self, doc: str, tag: "DocumentTag") -> bool:
+        """Indexes a document and returns True if it's new."""
+        if self.docs is None or self.docs.add(doc):
+            doc_id = self.num_docs
+            self.num_docs += 1
+            new = True
+        else:
+            doc_id = self.docs.find(doc)
+            self.num_duplicates += 1
+            new = False
+        postings = self.postings
+        for key in _index_keys(tag):
+            if (ids := postings.get(key)) is None:
+                ids = postings[key] = array("I")
+            if not ids or ids[-1] != doc_id:
+                ids.append(doc_id)
+        return new
+
+    def holdout(self, *queries: dict) -> array:
+        """Ids of the documents matching any of the queries, each a dict of lookup() arguments."""
+        return _union_ids([self.lookup(**query) for query in queries])
+
+    def leaks(self, train_ids: Iterable[int], *queries: dict) -> array:
+        """Ids in `train_ids` of documents matching any of the queries."""
+        return _intersect_ids(_union_ids([array("I", train_ids)]), self.holdout(*queries))
+
+    def lookup(self,
+               family: str | None = None,
+               template: str | None = None,
+               operand: int | None = None,
+               operands: Iterable[int] | None = None) -> array:
+        """Sorted ids of the documents matching every criterion given."""
+        keys = []
+        if family is not None:
+            keys.append(("family", family))
+        if template is not None:
+            keys.append(("template", template))
+        if operand is not None:
+            keys.append(("operand", abs(operand)))
+        if operands is not None:
+            keys.append(("operands", tuple(sorted(abs(x) for x in operands))))
+        if not keys:
+            raise ValueError("lookup needs at least one criterion")
+        ids = _union_ids([self.postings.get(keys[0], array("I"))])
+        for key in keys[1:]:
+            ids = _intersect_ids(ids, _union_ids([self.postings.get(key, array("I"))]))
+        return ids
+
+    def save(self, path: str):
+        """Saves the postings only; a loaded index doesn't dedup."""
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump({"num_docs": self.num_docs, "num_duplicates": self.num_duplicates,
+                         "postings": self.postings}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusIndex":
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        index = cls(dedup=False)
+        index.num_docs = state["num_docs"]
+        index.num_duplicates = state["num_duplicates"]
+        index.postings = state["postings"]
+        return index
+
+    def split(self, *queries: dict) -> tuple[array, array]:
+        """Returns (train ids, eval ids), holding out every document matching any of the queries."""
+        held_out = self.holdout(*queries)
+        return _difference_ids(array("I", range(self.num_docs)), held_out), held_out
+
+
+def _difference_ids(a: array, b: array) -> array:
+    """Ids in sorted `a` but not in sorted `b`."""
+    if np is not None:
+        return array("I", np.setdiff1d(_id_column(a), _id_column(b), assume_unique=True).tobytes())
+    exclude = set(b)
+    return array("I", (i for i in a if i not in exclude))
+
+
+def _hash_bytes(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def _id_column(ids: array) -> "np.ndarray":
+    return np.frombuffer(ids, dtype=np.uint32) if len(ids) else np.empty(0, dtype=np.uint32)
+
+
+def _index_keys(tag: "DocumentTag") -> list[tuple]:
+    keys = [("family", tag.family), ("template", tag.template_id)]
+    if tag.operands:
+        magnitudes = tuple(sorted(abs(x) for x in tag.operands))
+        keys += [("operand", x) for x in dict.fromkeys(magnitudes)]
+        keys.append(("operands", magnitudes))
+    return keys
+
+
+def _intersect_ids(a: array, b: array) -> array:
+    """Ids in both sorted arrays."""
+    if np is not None:
+        return array("I", np.intersect1d(_id_column(a), _id_column(b), assume_unique=True).tobytes())
+    return array("I", sorted(set(a).intersection(b)))
+
+
+def _union_ids(id_arrays: list[array]) -> array:
+    """Sorted, distinct ids in any of the arrays."""
+    if np is not None:
+        return array("I", np.unique(np.concatenate([_id_column(ids) for ids in id_arrays] or [_id_column(array("I"))]))
+                     .tobytes())
+    return array("I", sorted(set().union(*id_arrays)))
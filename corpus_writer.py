@@ -0,0 +1,313 @@
+"""
+Write a generated corpus to fixed-size, compressed shards in the layout the nanochat pretraining loader reads: one
+document per row in a `text` column (Parquet) or one `{"text": ...}` object per line (JSONL), plus a manifest.json
+with per-shard counts and checksums. The "tokens" format writes pre-tokenized, memory-mappable shards instead.
+"""
+import gzip
+import hashlib
+import importlib.util
+import itertools
+import json
+import mmap
+import os
+import pickle
+import struct
+from array import array
+from collections import deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+FORMATS = ("jsonl", "parquet", "tokens")
+COMPRESSIONS = ("zstd", "gzip", None)
+MANIFEST_NAME = "manifest.json"
+# The pyproject.toml extra that installs each optional dependency
+EXTRAS = {"pyarrow": "parquet", "tiktoken": "tokens", "zstandard": "zstd"}
+
+# The GPT-4 (cl100k_base) pre-tokenizer pattern, used for .tiktoken vocab files, which don't store their own.
+GPT4_SPLIT_PATTERN = (r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|"""
+                      r"""\s*[\r\n]|\s+(?!\S)|\s""")
+TOKEN_SHARD_MAGIC = b"CTOKENS1"
+
+# Set in each tokenizing worker process by _init_tokenizer.
+_tokenizer: "FragmentTokenizer | None" = None
+
+
+class FragmentTokenizer:
+    """Tokenizes documents with a tiktoken Encoding, caching the tokens of each space-delimited fragment."""
+
+    def __init__(self, encoding, max_cache: int = 1 << 20):
+        self.encoding = encoding
+        self.max_cache = max_cache
+        self.cache: dict[str, list[int]] = {}
+        self.typecode = "H" if encoding.n_vocab <= 1 << 16 else "I"
+
+    def encode(self, doc: str) -> list[int]:
+        cache = self.cache
+        tokens = []
+        for fragment in doc.replace(" ", "\0 ").split("\0"):
+            if (fragment_tokens := cache.get(fragment)) is None:
+                if len(cache) >= self.max_cache:
+                    cache.clear()
+                fragment_tokens = cache[fragment] = self.encoding.encode_ordinary(fragment)
+            tokens += fragment_tokens
+        return tokens
+
+    def encode_batch(self, docs: Iterable[str]) -> tuple[array, array]:
+        """Returns the packed tokens of `docs` and their offsets: document i is tokens[offsets[i]:offsets[i + 1]]."""
+        tokens = array(self.typecode)
+        offsets = array("Q", [0])
+        for doc in docs:
+            tokens.extend(self.encode(doc))
+            offsets.append(len(tokens))
+        return tokens, offsets
+
+
+def append_corpus(units: Iterable[tuple[dict, Iterable[str]]],
+                  out_dir: str,
+                  docs_per_shard: int = 100_000,
+                  fmt: str = "jsonl",
+                  compression: str | None = "gzip",
+                  workers: int = 2,
+                  manifest_extra: dict | None = None,
+                  tokenizer: str | None = None) -> dict:
+    """Appends (progress, docs) units to the corpus in `out_dir` and checkpoints the manifest after every shard."""
+    check_options(fmt, compression, tokenizer)
+    manifest = read_manifest(out_dir) or {"format": fmt, "compression": compression, "progress": None, "shards": []}
+    if (manifest["format"], manifest["compression"]) != (fmt, compression):
+        raise ValueError(f"{out_dir} holds {manifest['format']} shards with {manifest['compression']} compression, "
+                         f"not {fmt} with {compression}")
+    manifest.update(manifest_extra or {})
+    return _write_units(units, out_dir, manifest, docs_per_shard, workers, tokenizer)
+
+
+def load_tokenizer(path: str, pattern: str = GPT4_SPLIT_PATTERN) -> FragmentTokenizer:
+    """
+    Loads a tokenizer from a local file: a pickled tiktoken Encoding (such as nanochat's tokenizer.pkl), or a
+    .tiktoken BPE vocab split with `pattern`. Nothing is downloaded.
+    """
+    import tiktoken  # Optional dependency, only needed for token output.
+    if path.endswith(".pkl"):
+        with open(path, "rb") as f:
+            encoding = pickle.load(f)
+    else:
+        from tiktoken.load import load_tiktoken_bpe
+        encoding = tiktoken.Encoding(os.path.basename(path), pat_str=pattern,
+                                     mergeable_ranks=load_tiktoken_bpe(path), special_tokens={})
+    return FragmentTokenizer(encoding)
+
+
+def check_options(fmt: str, compression: str | None, tokenizer: str | None = None):
+    """
+    Raises ValueError for an invalid combination of writer options, and ModuleNotFoundError up front, rather than
+    from a writer thread, when they need an optional dependency that isn't installed.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt!r}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression!r}")
+    if fmt == "tokens" and (compression is not None or tokenizer is None):
+        raise ValueError("Token shards need a tokenizer and are left uncompressed so they can be memory-mapped")
+    needed = [({"parquet": "pyarrow", "tokens": "tiktoken"}.get(fmt), f"{fmt} output"),
+              ("zstandard" if fmt == "jsonl" and compression == "zstd" else None, "zstd-compressed JSONL")]
+    for module, reason in needed:
+        if module is not None and importlib.util.find_spec(module) is None:
+            raise ModuleNotFoundError(f"{reason} needs {module}, which isn't installed; pip install "
+                                      f"'curriculum[{EXTRAS[module]}]', or write gzip-compressed JSONL instead",
+                                      name=module)
+
+
+def compress_bytes(data: bytes, compression: str | None) -> bytes:
+    match compression:
+        case None:
+            return data
+        case "gzip":
+            return gzip.compress(data, compresslevel=6, mtime=0)
+        case "zstd":
+            import zstandard  # Optional dependency, only needed for zstd-compressed JSONL.
+            return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unknown compression: {compression!r}")
+
+
+def read_manifest(out_dir: str) -> dict | None:
+    """Returns the manifest of the corpus in `out_dir`, or None if nothing has been written there yet."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_shard(path: str, tokenizer: str | FragmentTokenizer | None = None) -> list[str]:
+    """Reads back the documents of a shard written by write_shard, decoding token shards with `tokenizer`."""
+    if path.endswith(".tokens"):
+        if tokenizer is None:
+            raise ValueError(f"{path} holds token ids; pass the tokenizer it was written with, or use read_token_shard")
+        if isinstance(tokenizer, str):
+            tokenizer = load_tokenizer(tokenizer)
+        offsets, tokens = read_token_shard(path)
+        decode = tokenizer.encoding.decode_bytes
+        return [decode(tokens[offsets[i]:offsets[i + 1]].tolist()).decode() for i in range(len(offsets) - 1)]
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq  # Optional dependency, only needed for Parquet output.
+        return pq.read_table(path, columns=["text"]).column("text").to_pylist()
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".gz"):
+        data = gzip.decompress(data)
+    elif path.endswith(".zst"):
+        import zstandard  # Optional dependency, only needed for zstd-compressed JSONL.
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    # Split on b"\n" only: documents may contain characters str.splitlines treats as line breaks.
+    return [json.loads(line)["text"] for line in data.split(b"\n") if line]
+
+
+def read_token_shard(path: str) -> tuple[memoryview, memoryview]:
+    """
+    Maps a token shard and returns (offsets, tokens) as zero-copy uint64 and uint16/uint32 views, so document i is
+    tokens[offsets[i]:offsets[i + 1]]. np.frombuffer turns either into an array without copying.
+    """
+    with open(path, "rb") as f:
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    if data[:8] != TOKEN_SHARD_MAGIC:
+        raise ValueError(f"{path} is not a token shard")
+    itemsize, num_docs, num_tokens = struct.unpack_from("<QQQ", data, 8)
+    start = 32 + 8 * (num_docs + 1)
+    return data[32:start].cast("Q"), data[start:start + itemsize * num_tokens].cast("H" if itemsize == 2 else "I")
+
+
+def shard_file_name(index: int, fmt: str, compression: str | None) -> str:
+    if fmt == "parquet":
+        # Parquet compresses column chunks internally, so the file name doesn't change.
+        return f"shard_{index:05d}.parquet"
+    if fmt == "tokens":
+        return f"shard_{index:05d}.tokens"
+    suffix = {None: "", "gzip": ".gz", "zstd": ".zst"}[compression]
+    return f"shard_{index:05d}.jsonl{suffix}"
+
+
+def write_corpus(docs: Iterable[str],
+                 out_dir: str,
+                 docs_per_shard: int = 100_000,
+                 fmt: str = "jsonl",
+                 compression: str | None = "gzip",
+                 workers: int = 2,
+                 manifest_extra: dict | None = None,
+                 tokenizer: str | None = None) -> dict:
+    """Writes `docs` to shards in `out_dir` on a worker pool and returns the manifest."""
+    check_options(fmt, compression, tokenizer)
+    manifest = {"format": fmt, "compression": compression, "progress": None, "shards": [], **(manifest_extra or {})}
+    units = ((None, batch) for batch in itertools.batched(docs, docs_per_shard))
+    return _write_units(units, out_dir, manifest, docs_per_shard, workers, tokenizer)
+
+
+def write_shard(docs: list[str], path: str, fmt: str, compression: str | None,
+                tokenizer: FragmentTokenizer | None = None) -> dict:
+    """Writes one shard and returns its manifest entry. Token shards need a `tokenizer`."""
+    num_tokens = None
+    if fmt == "jsonl":
+        text = "".join(json.dumps({"text": doc}, ensure_ascii=False) + "\n" for doc in docs).encode()
+        data = compress_bytes(text, compression)
+        _write_atomically(path, data)
+    elif fmt == "parquet":
+        import pyarrow as pa  # Optional dependency, only needed for Parquet output.
+        import pyarrow.parquet as pq
+        tmp_path = path + ".tmp"
+        table = pa.table({"text": pa.array(docs, type=pa.string())})
+        pq.write_table(table, tmp_path, compression=compression or "none", row_group_size=1024)
+        os.replace(tmp_path, path)
+    elif fmt == "tokens":
+        tokens, offsets = tokenizer.encode_batch(docs)
+        num_tokens = len(tokens)
+        header = TOKEN_SHARD_MAGIC + struct.pack("<QQQ", tokens.itemsize, len(docs), num_tokens)
+        _write_atomically(path, header + offsets.tobytes() + tokens.tobytes())
+    else:
+        raise ValueError(f"Unknown format: {fmt!r}")
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            sha256.update(chunk)
+    return {
+        "file": os.path.basename(path),
+        "num_docs": len(docs),
+        "num_text_bytes": sum(len(doc.encode()) for doc in docs),
+        "num_file_bytes": os.path.getsize(path),
+        "sha256": sha256.hexdigest(),
+        **({} if num_tokens is None else {"num_tokens": num_tokens}),
+    }
+
+
+def _init_tokenizer(path: str):
+    global _tokenizer
+    _tokenizer = load_tokenizer(path)
+
+
+def _shard_executor(fmt: str, workers: int, tokenizer: str | None) -> tuple[Executor, Callable[..., dict]]:
+    """A pool to write shards on and the function to submit: threads for text, processes for tokenizing."""
+    if fmt == "tokens":
+        return ProcessPoolExecutor(max(workers, 1), initializer=_init_tokenizer, initargs=(tokenizer,)), \
+            _write_token_shard
+    return ThreadPoolExecutor(max(workers, 1)), write_shard
+
+
+def _write_token_shard(docs: list[str], path: str, fmt: str, compression: str | None) -> dict:
+    return write_shard(docs, path, fmt, compression, _tokenizer)
+
+
+def _save_manifest(out_dir: str, manifest: dict):
+    shards = manifest["shards"]
+    manifest["num_docs"] = sum(s["num_docs"] for s in shards)
+    manifest["num_text_bytes"] = sum(s["num_text_bytes"] for s in shards)
+    manifest["num_file_bytes"] = sum(s["num_file_bytes"] for s in shards)
+    if manifest["format"] == "tokens":
+        manifest["num_tokens"] = sum(s["num_tokens"] for s in shards)
+    _write_atomically(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode())
+
+
+def _write_units(units: Iterable[tuple[dict | None, Iterable[str]]],
+                 out_dir: str,
+                 manifest: dict,
+                 docs_per_shard: int,
+                 workers: int,
+                 tokenizer: str | None) -> dict:
+    """Writes units of documents to shards after those in `manifest`, saving it after every shard."""
+    fmt, compression = manifest["format"], manifest["compression"]
+    os.makedirs(out_dir, exist_ok=True)
+
+    pending: deque[tuple[Future, dict | None]] = deque()
+
+    def checkpoint(future: Future, progress: dict | None):
+        manifest["shards"].append(future.result())
+        manifest["progress"] = progress
+        _save_manifest(out_dir, manifest)
+
+    executor, write = _shard_executor(fmt, workers, tokenizer)
+    with executor:
+        def submit(batch: list[str], progress: dict | None):
+            path = os.path.join(out_dir, shard_file_name(len(manifest["shards"]) + len(pending), fmt, compression))
+            pending.append((executor.submit(write, batch, path, fmt, compression), progress))
+            while len(pending) > 2 * max(workers, 1):
+                checkpoint(*pending.popleft())
+
+        batch = []
+        progress = None
+        for progress, docs in units:
+            batch += docs
+            if len(batch) >= docs_per_shard:
+                submit(batch, progress)
+                batch = []
+        if batch:
+            submit(batch, progress)
+        while pending:
+            checkpoint(*pending.popleft())
+    if progress is not None:
+        # Units at the end that left no documents still count as done.
+        manifest["progress"] = progress
+    _save_manifest(out_dir, manifest)
+    return manifest
+
+
+def _write_atomically(path: str, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,135 @@
+"""
+Serve the corpus over a local Unix socket instead of storing it. Messages are a 4-byte little-endian length
+followed by a JSON object {"unit": index, "docs": [...]}; a zero length ends the stream.
+"""
+import asyncio
+import itertools
+import json
+import os
+import socket
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+import math_curriculum as mc
+
+
+class CurriculumServer:
+    """Streams rendered work units to clients, at most `prefetch` units ahead per connection."""
+
+    def __init__(self,
+                 path: str,
+                 seed: int = 0,
+                 upper: int | None = None,
+                 shard_size: int = 64,
+                 workers: int | None = None,
+                 prefetch: int = 8):
+        self.path = path
+        self.seed = seed
+        self.upper = upper
+        self.shard_size = shard_size
+        self.workers = workers or os.cpu_count() or 1
+        self.prefetch = prefetch
+
+    async def serve_forever(self):
+        self.executor = ProcessPoolExecutor(self.workers)
+        try:
+            server = await asyncio.start_unix_server(self._handle, self.path)
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        request = json.loads(await reader.readline())
+        rank, world_size, start = request.get("rank", 0), request.get("world_size", 1), request.get("start", 0)
+        if not 0 <= rank < world_size:
+            writer.close()
+            return
+        units = itertools.islice(enumerate(mc.iter_work_units(self.upper, self.shard_size)), start, None)
+        pending: asyncio.Queue = asyncio.Queue(self.prefetch)
+
+        async def produce():
+            for index, (kind, items) in units:
+                if index % world_size == rank:
+                    future = loop.run_in_executor(self.executor, mc.generate_work_unit, kind, items, self.seed)
+                    await pending.put((index, future))
+            await pending.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await pending.get()) is not None:
+                index, future = item
+                payload = json.dumps({"unit": index, "docs": await future}, ensure_ascii=False).encode()
+                writer.write(len(payload).to_bytes(4, "little") + payload)
+                await writer.drain()
+            writer.write((0).to_bytes(4, "little"))
+            await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass  # The client went away; its rank can reconnect with `start` to resume.
+        finally:
+            producer.cancel()
+            while not pending.empty():
+                if item := pending.get_nowait():
+                    item[1].cancel()
+            writer.close()
+
+
+class CurriculumClient:
+    """Iterates over the documents a CurriculumServer streams for one rank."""
+
+    def __init__(self,
+                 path: str,
+                 rank: int = 0,
+                 world_size: int = 1,
+                 start: int = 0,
+                 dedup: str | mc.Dedup | None = None):
+        if not 0 <= rank < world_size:
+            raise ValueError(f"rank {rank} is outside a world of size {world_size}")
+        self.path = path
+        self.rank = rank
+        self.world_size = world_size
+        self.next_unit = start
+        self.dedup = dedup
+
+    def __iter__(self) -> Iterator[str]:
+        seen = mc.make_dedup(self.dedup, streaming=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.path)
+            request = {"rank": self.rank, "world_size": self.world_size, "start": self.next_unit}
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                while length := int.from_bytes(_read_exactly(f, 4), "little"):
+                    message = json.loads(_read_exactly(f, length))
+                    for doc in message["docs"]:
+                        if seen is None or seen.add(doc):
+                            yield doc
+                    self.next_unit = message["unit"] + 1
+
+
+def _read_exactly(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) < n:
+        raise ConnectionError("The curriculum server closed the connection mid-message")
+    return data
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default="curriculum.sock", help="Unix socket path to listen on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--upper", type=int, help="stop after numbers 0..UPPER-1 and their pairs (default: never)")
+    parser.add_argument("--shard-size", type=int, default=64, help="numbers or pairs per work unit")
+    parser.add_argument("--workers", type=int, default=None, help="generation processes (default: all cores)")
+    parser.add_argument("--prefetch", type=int, default=8, help="work units generated ahead, per connection")
+    args = parser.parse_args()
+
+    server = CurriculumServer(args.socket, args.seed, args.upper, args.shard_size, args.workers, args.prefetch)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
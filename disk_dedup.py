@@ -0,0 +1,176 @@
+"""
+Exact deduplication for corpora larger than memory. Documents are hash-partitioned into bucket files on disk, each
+bucket is deduplicated on its own across a process pool, and the unique documents are streamed back bucket by bucket.
+The result is the same set of documents an in-memory set would give, with memory bounded by a budget.
+"""
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+FINGERPRINT_BITS = (None, 64, 128)
+
+# Rough per-document memory cost of deduplicating a bucket, on top of the document itself when it's kept in memory.
+EXACT_OVERHEAD = 120
+FINGERPRINT_OVERHEAD = 100
+
+# Buckets still over budget after this many re-partitions are mostly one document repeated, which dedups to almost
+# nothing, so they are deduplicated in memory regardless.
+MAX_DEPTH = 4
+
+
+class DiskDedup:
+    """Out-of-core exact dedup within `memory_budget`, called on an iterable of documents."""
+
+    def __init__(self,
+                 work_dir: str | None = None,
+                 memory_budget: int = 1 << 30,
+                 num_buckets: int = 256,
+                 fingerprint_bits: int | None = None,
+                 workers: int | None = None):
+        if fingerprint_bits not in FINGERPRINT_BITS:
+            raise ValueError(f"fingerprint_bits must be one of {FINGERPRINT_BITS}, got {fingerprint_bits!r}")
+        self.work_dir = work_dir
+        self.memory_budget = memory_budget
+        self.num_buckets = num_buckets
+        self.fingerprint_bits = fingerprint_bits
+        self.workers = workers or os.cpu_count() or 1
+        self.num_duplicates = 0
+        self.num_collisions = 0
+
+    def __call__(self, docs: Iterable[str]) -> Iterator[str]:
+        """Yields the unique documents in `docs`, grouped by bucket rather than in their original order."""
+        tmp_dir = tempfile.mkdtemp(prefix="dedup-", dir=self.work_dir)
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            buckets = partition((doc.encode() for doc in docs), tmp_dir, self.num_buckets, self.memory_budget // 4)
+            jobs = [(path, count, path + ".unique", self.fingerprint_bits, self.memory_budget // self.workers)
+                    for path, count in buckets]
+            results = (executor.map if executor else map)(dedup_bucket, *zip(*jobs)) if jobs else []
+            for (path, count, unique_path, *_), (num_unique, num_collisions) in zip(jobs, results):
+                os.remove(path)
+                self.num_duplicates += count - num_unique
+                self.num_collisions += num_collisions
+                for record in read_records(unique_path):
+                    yield record.decode()
+                os.remove(unique_path)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def dedup_bucket(path: str,
+                 count: int,
+                 out_path: str,
+                 fingerprint_bits: int | None,
+                 memory_budget: int,
+                 depth: int = 0) -> tuple[int, int]:
+    """
+    Appends the unique records of one bucket file to `out_path` and returns (unique records, fingerprint
+    collisions). Re-partitions the bucket first if deduplicating it in memory could exceed `memory_budget`.
+    """
+    size = os.path.getsize(path)
+    estimate = count * FINGERPRINT_OVERHEAD if fingerprint_bits else size + count * EXACT_OVERHEAD
+    if estimate > memory_budget and depth < MAX_DEPTH:
+        sub_dir = path + ".split"
+        os.mkdir(sub_dir)
+        num_unique = num_collisions = 0
+        buckets = partition(read_records(path), sub_dir, 2 * -(-estimate // memory_budget), memory_budget // 4,
+                            salt=depth + 1)
+        for sub_path, sub_count in buckets:
+            unique, collisions = dedup_bucket(sub_path, sub_count, out_path, fingerprint_bits, memory_budget,
+                                              depth + 1)
+            num_unique += unique
+            num_collisions += collisions
+        shutil.rmtree(sub_dir)
+        return num_unique, num_collisions
+
+    num_unique = num_collisions = 0
+    with open(out_path, "ab") as out:
+        if fingerprint_bits is None:
+            seen = set()
+            for record in read_records(path):
+                if record not in seen:
+                    seen.add(record)
+                    out.write(_encode_record(record))
+                    num_unique += 1
+            return num_unique, 0
+
+        if size == 0:
+            return 0, 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offsets: dict[bytes, int | list[int]] = {}  # Fingerprint -> offset(s) of the unique records having it
+            offset = 0
+            while offset < size:
+                length = int.from_bytes(data[offset:offset + 4], "little")
+                record = data[offset + 4:offset + 4 + length]
+                fingerprint = hashlib.blake2b(record, digest_size=fingerprint_bits // 8).digest()
+                if (previous := offsets.get(fingerprint)) is None:
+                    offsets[fingerprint] = offset
+                else:
+                    previous = [previous] if isinstance(previous, int) else previous
+                    if any(_record_at(data, p) == record for p in previous):
+                        offset += 4 + length
+                        continue
+                    # Same fingerprint, different document: keep both.
+                    offsets[fingerprint] = previous + [offset]
+                    num_collisions += 1
+                out.write(data[offset:offset + 4 + length])
+                num_unique += 1
+                offset += 4 + length
+    return num_unique, num_collisions
+
+
+def partition(records: Iterable[bytes],
+              out_dir: str,
+              num_buckets: int,
+              buffer_size: int = 1 << 26,
+              salt: int = 0) -> list[tuple[str, int]]:
+    """
+    Hash-partitions records into `num_buckets` length-prefixed files in `out_dir`, and returns the (path, record
+    count) of each non-empty bucket. Buffers are flushed whenever they hold `buffer_size` bytes in total.
+    """
+    salt_bytes = salt.to_bytes(16, "little")
+    buffers = [bytearray() for _ in range(num_buckets)]
+    counts = [0] * num_buckets
+    paths = [os.path.join(out_dir, f"bucket_{i:05d}") for i in range(num_buckets)]
+    buffered = 0
+
+    def flush():
+        for i, buffer in enumerate(buffers):
+            if buffer:
+                with open(paths[i], "ab") as f:
+                    f.write(buffer)
+                buffer.clear()
+
+    for record in records:
+        digest = hashlib.blake2b(record, digest_size=8, salt=salt_bytes).digest()
+        i = int.from_bytes(digest, "little") % num_buckets
+        buffers[i] += _encode_record(record)
+        counts[i] += 1
+        buffered += len(record) + 4
+        if buffered >= buffer_size:
+            flush()
+            buffered = 0
+    flush()
+    return [(paths[i], counts[i]) for i in range(num_buckets) if counts[i]]
+
+
+def read_records(path: str) -> Iterator[bytes]:
+    """Yields the records of a length-prefixed file written by partition or dedup_bucket."""
+    with open(path, "rb") as f:
+        while header := f.read(4):
+            yield f.read(int.from_bytes(header, "little"))
+
+
+def _encode_record(record: bytes) -> bytes:
+    return len(record).to_bytes(4, "little") + record
+
+
+def _record_at(data: mmap.mmap, offset: int) -> bytes:
+    length = int.from_bytes(data[offset:offset + 4], "little")
+    return data[offset + 4:offset + 4 + length]
@@ -2,10 +2,32 @@
 Generate a corpus of short maxims and expressions for pretraining.
 Conceptually, this is like memorizing multiplication tables early in childhood education.
 """
+import contextlib
+import functools
+import hashlib
+import heapq
+import itertools
+import json
 import math
+import os
 import random
+import re
+import sys
+import time
+import warnings
+from array import array
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Protocol
 
-from num2words import num2words
+from corpus_index import CompactCorpus, CorpusIndex
+from disk_dedup import DiskDedup
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional (the fast extra); pair_arithmetic falls back to plain Python without it.
+    np = None
 
 SUBSCRIPT_MAP = {
     "0": "₀", "1": "₁", "2": "₂", "3": "₃", "4": "₄",
@@ -19,375 +41,1048 @@ SUPERSCRIPT_MAP = {
 }
 
 
-def a_divided_by_b_examples(a, b, q, r, f) -> list[str]:
-    """Generates examples, given that a / b = q + r/b, which has a float value of f."""
-    stmts = []
-    if q == 0 and r > 0:
-        # Fraction
-        perc = f * 100
-        ab_gcd = math.gcd(a, b)
-        a_simplified = a // ab_gcd
-        b_simplified = b // ab_gcd
-        stmts += [
-            f"The greatest common divisor of {a} and {b} is {ab_gcd}.",
-            f"{a} % {b} = {r}",
-            f"{a} // {b} = 0",
-            f"{a} ÷ {b} = {a}{random_division_sign(exclude={'÷'})}{b}",
-        ]
-        if ab_gcd != 1:  # Can be reduced
-            stmts += [
-                f"The ratio of {a} to {b} is {a_simplified}:{b_simplified}.",
-                f"{a} / {b} = {a_simplified}/{b_simplified}".replace("/", random_division_sign(exclude={'÷'})),
-                f"{a}/{b} = {a_simplified}/{b_simplified}".replace("/", random_division_sign(exclude={'÷'})),
-                f"{a}/{b} {random.choice(['reduces', 'simplifies'])} to {a_simplified}/{b_simplified}.".replace("/", random_division_sign(exclude={'÷'})),
-                f"{to_superscript(a)}⁄{to_subscript(b)} = {to_superscript(a_simplified)}⁄{to_subscript(b_simplified)}",
-                f"{to_superscript(a)}⁄{to_subscript(b)} {random.choice(['reduces', 'simplifies'])} to {to_superscript(a_simplified)}⁄{to_subscript(b_simplified)}.",
-            ]
-        else:
-            stmts += [
-                f"{a} / {b} = {a}/{b}".replace("/", random_division_sign(exclude={'÷'})),
-                f"{a} ⁄ {b} = {to_superscript(a)}⁄{to_subscript(b)}",
-            ]
+class Dedup(Protocol):
+    def add(self, doc: str) -> bool:
+        """Records `doc` and returns True if it hasn't been seen before."""
+        ...
 
-        if is_denominator_of_terminating_decimal(b_simplified):
-            stmts += [
-                f"The ratio of {a} to {b} is {f}.",
-                f"{a_simplified}/{b_simplified} = {perc}%",
-                f"{a} divided by {b} {random.choice(['equals', 'is'])} {f}.",
-                f"{a} {random_division_sign()} {b} = {f}",
-                f"{a}/{b} = {perc}%",
-                f"{to_superscript(a)}⁄{to_subscript(b)} = {perc}%",
-                f"{to_superscript(a_simplified)}⁄{to_subscript(b_simplified)} = {perc}%",
-                f"{to_superscript(r)}⁄{to_subscript(b)} = {f}",
-            ]
+
+class ExactDedup:
+    """Remembers every document, exactly like the set used by generate_corpus."""
+
+    def __init__(self):
+        self.seen: set[str] = set()
+        self.num_duplicates = 0
+
+    def add(self, doc: str) -> bool:
+        if doc in self.seen:
+            self.num_duplicates += 1
+            return False
+        self.seen.add(doc)
+        return True
+
+
+class FingerprintDedup:
+    """
+    Remembers 64-bit fingerprints in a fixed-size open-addressing table, so memory stays flat. Past `max_load`, new
+    documents pass through without being recorded; they're counted in `num_overflowed`.
+    """
+
+    def __init__(self, capacity: int = 1 << 22, max_load: float = 0.75, memory_budget: int | None = None):
+        if memory_budget is not None:
+            capacity = 1 << max((memory_budget // 8).bit_length() - 1, 1)  # The largest table that fits the budget
+        self.capacity = 1 << max(capacity - 1, 1).bit_length()
+        self.mask = self.capacity - 1
+        self.max_size = int(self.capacity * max_load)
+        self.slots = array("Q", bytes(8 * self.capacity))  # 0 marks an empty slot
+        self.size = 0
+        self.num_duplicates = 0
+        self.num_overflowed = 0
+
+    def add(self, doc: str) -> bool:
+        fingerprint = int.from_bytes(hashlib.blake2b(doc.encode(), digest_size=8).digest(), "little") or 1
+        slots = self.slots
+        i = fingerprint & self.mask
+        while (slot := slots[i]) != 0:
+            if slot == fingerprint:
+                self.num_duplicates += 1
+                return False
+            i = (i + 1) & self.mask
+        if self.size >= self.max_size:
+            if self.num_overflowed == 0:
+                warnings.warn(f"FingerprintDedup is full at {self.size} fingerprints; further documents won't be "
+                              f"deduplicated. Give it a larger capacity or memory budget.", RuntimeWarning, stacklevel=2)
+            self.num_overflowed += 1
         else:
-            stmts += [
-                f"The ratio of {a} to {b} is {random.choice(['approximately', 'roughly'])} {f}.",
-                f"{a_simplified}/{b_simplified} ≈ {perc}%",
-                f"{a} divided by {b} {random.choice(['equals', 'is'])} {random.choice(['approximately', 'roughly'])} {f}.",
-                f"{a} {random_division_sign()} {b} ≈ {f}",
-                f"{a}/{b} ≈ {perc}%",
-                f"{to_superscript(a)}⁄{to_subscript(b)} ≈ {perc}%",
-                f"{to_superscript(a_simplified)}⁄{to_subscript(b_simplified)} ≈ {perc}%",
-                f"{to_superscript(r)}⁄{to_subscript(b)} ≈ {f}",
-            ]
+            slots[i] = fingerprint
+            self.size += 1
+        return True
 
-    elif r == 0:
-        # Perfect division
-        match q:
-            case 2:
-                stmts += [
-                    f"{a} is {random.choice(['double', 'twice', 'twice as much as'])} {b}.",
-                    f"{b} is {random.choice(['half', 'half as much as', 'half of'])} {a}.",
-                ]
-            case 3:
-                stmts.append(f"{a} is triple {b}.")
-            case 4:
-                stmts.append(f"{a} is quadruple {b}.")
-        q_word = num2words(q)
-        q_ordinal = num2words(q, to='ordinal')
-        stmts += [
-            f"The quotient of {a} and {b} {random.choice(['equals', 'is'])} {q}.",
-            f"The ratio of {a} to {b} is {q}.",
-            f"{a} divided by {b} {random.choice(['equals', 'is'])} {q}.",
-            f"{a} {random.choice(['is divisible by', 'is a multiple of'])} {b}.",
-            f"{a} {random_division_sign()} {b} = {q}",
-        ]
-        if a != 0:
-            stmts += [
-                f"{a} is {q_word} {random.choice(['times', 'times as much as'])} {b}.",
-                f"{b} goes into {a}, {q} times.",
-                f"{b} {random.choice(['divides', 'is a divisor of', 'is a factor of'])} {a}.",
-                f"{q} {random.choice(['divides', 'is a divisor of', 'is a factor of'])} {a}.",
-            ]
-            if q > 2:
-                stmts.append(f"{b} is one-{q_ordinal} of {a}.")
-        if q != 0:
-            stmts.append(f"{a} {random.choice(['is divisible by', 'is a multiple of'])} {q}.")
-    else:
-        # Euclidean division
+
+class GenerationStats:
+    """Calls, seconds, documents, bytes and duplicates per family and per template."""
+    FIELDS = ("calls", "seconds", "docs", "bytes", "duplicates")
+
+    def __init__(self):
+        self.families: dict[str, dict[str, float]] = {}
+        self.templates: dict[str, dict[str, float]] = {}
+        # Template ids of documents generated but not yet seen by a dedup stage, so a duplicate can be charged to
+        # the template that produced it. Only filled while a corpus iterator is consuming documents.
+        self.track_sources = False
+        self._sources: dict[str, deque[str]] = {}
+
+    def record_call(self, family: str, docs: list[str], seconds: float, template_id: str | None = None):
+        """Counts one call of a family. With `template_id`, the documents are also charged to that template."""
+        num_bytes = sum(len(doc.encode()) for doc in docs)
+        for counters in [self._counters(self.families, family)] + (
+                [] if template_id is None else [self._counters(self.templates, template_id)]):
+            counters["calls"] += 1
+            counters["seconds"] += seconds
+            counters["docs"] += len(docs)
+            counters["bytes"] += num_bytes
+        if template_id is not None and self.track_sources:
+            for doc in docs:
+                self._sources.setdefault(doc, deque()).append(template_id)
+
+    def record_template(self, template_id: str, doc: str, seconds: float):
+        counters = self._counters(self.templates, template_id)
+        counters["calls"] += 1
+        counters["seconds"] += seconds
+        counters["docs"] += 1
+        counters["bytes"] += len(doc.encode())
+        if self.track_sources:
+            self._sources.setdefault(doc, deque()).append(template_id)
+
+    def record_dedup(self, doc: str, duplicate: bool):
+        """Called by the corpus iterators for every document their dedup stage sees."""
+        if (sources := self._sources.get(doc)) is None:
+            return
+        template_id = sources.popleft()
+        if not sources:
+            del self._sources[doc]
+        if duplicate:
+            self._counters(self.templates, template_id)["duplicates"] += 1
+            self._counters(self.families, template_id.split(".")[0])["duplicates"] += 1
+
+    def to_dict(self) -> dict:
+        return {"families": self.families, "templates": self.templates}
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def summary(self, sort_by: str = "seconds") -> str:
+        """A table of the families, most expensive first."""
+        lines = [f"{'family':<20} {'calls':>10} {'seconds':>9} {'docs':>10} {'MB':>8} {'dup %':>6}"]
+        for name, c in sorted(self.families.items(), key=lambda item: -item[1][sort_by]):
+            lines.append(f"{name:<20} {c['calls']:>10,} {c['seconds']:>9.3f} {c['docs']:>10,} {c['bytes'] / 1e6:>8.2f} "
+                         f"{100 * c['duplicates'] / c['docs'] if c['docs'] else 0:>6.1f}")
+        return "\n".join(lines)
+
+    def _counters(self, table: dict[str, dict[str, float]], key: str) -> dict[str, float]:
+        if (counters := table.get(key)) is None:
+            counters = table[key] = {field: 0.0 if field == "seconds" else 0 for field in self.FIELDS}
+        return counters
+
+
+def instrumented(family: str):
+    """
+    Decorates a hand-written example function so its calls are counted as `family` while stats are collected. When
+    they aren't, the only cost is one extra call and a global lookup.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _stats is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            stmts = fn(*args, **kwargs)
+            _stats.record_call(family, stmts, time.perf_counter() - start, template_id=family)
+            return stmts
+        return wrapper
+    return decorate
+
+
+class CounterRandom(random.Random):
+    """A random.Random whose i-th draw is a pure function of the seed, a key and i."""
+
+    def __init__(self, seed: int = 0, *key):
+        self._state = 0
+        super().__init__((seed, *key))
+
+    def seed(self, a=None, version=2):
+        self._state = _hash_key(*a) if isinstance(a, tuple) else _hash_key(a)
+
+    def random(self) -> float:
+        self._state = (self._state + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        return (_mix64(self._state) >> 11) * (1.0 / (1 << 53))
+
+    def getrandbits(self, k: int) -> int:
+        bits = 0
+        for _ in range(0, k, 64):
+            self._state = (self._state + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+            bits = (bits << 64) | _mix64(self._state)
+        return bits >> (-k % 64)
+
+    def getstate(self):
+        return self._state
+
+    def setstate(self, state):
+        self._state = state
+
+
+class KeyedPermutation:
+    """A keyed bijection on range(size): a Feistel network with cycle walking."""
+
+    def __init__(self, size: int, key: int, rounds: int = 4):
+        assert size > 0, "Permutation size must be positive"
+        self.size = size
+        self.half_bits = max((size - 1).bit_length() + 1, 2) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.round_keys = [_mix64(key + i) for i in range(rounds)]
+
+    def __call__(self, i: int) -> int:
+        half_bits, half_mask = self.half_bits, self.half_mask
+        while True:
+            left, right = i >> half_bits, i & half_mask
+            for round_key in self.round_keys:
+                left, right = right, left ^ (_mix64(right ^ round_key) & half_mask)
+            i = (left << half_bits) | right
+            if i < self.size:
+                return i
+
+
+class MixtureSampler:
+    """Lazily samples about `budget` units of documents, with the families mixed by `weights`."""
+
+    def __init__(self,
+                 weights: dict[str, float],
+                 budget: int,
+                 count: Callable[[str], int] | None = None,
+                 seed: int = 0,
+                 lower: int = 0,
+                 upper: int = 1000,
+                 dedup: str | Dedup | None = "exact"):
+        families = [family for families in SHARD_FAMILIES.values() for family in families]
+        if unknown := set(weights) - set(families):
+            raise ValueError(f"Unknown families {sorted(unknown)}; choose from {families}")
+        self.weights = {family: weight for family, weight in weights.items() if weight > 0}
+        self.budget = budget
+        self.count = count
+        self.seed = seed
+        self.lower = lower
+        self.upper = upper
+        self.dedup = dedup
+        # The realized mix, in budget units per family
+        self.emitted: dict[str, int] = dict.fromkeys(self.weights, 0)
+
+    def __iter__(self) -> Iterator[str]:
+        seen = make_dedup(self.dedup, streaming=True)
+        count = self.count
+        heap = [(0.0, i, family) for i, family in enumerate(self.weights)]
+        positions = dict.fromkeys(self.weights, 0)
+        spaces = {family: self._operand_space(family) for family in self.weights}
+        total = 0
+        while heap and total < self.budget:
+            _, i, family = heapq.heappop(heap)
+            size, render = spaces[family]
+            if positions[family] >= size:
+                continue
+            docs = render(positions[family])
+            positions[family] += 1
+            for doc in docs:
+                if seen is None or seen.add(doc):
+                    units = len(doc.encode()) if count is None else count(doc)
+                    self.emitted[family] += units
+                    total += units
+                    yield doc
+            heapq.heappush(heap, (self.emitted[family] / self.weights[family], i, family))
+
+    def _operand_space(self, family: str) -> tuple[int, Callable[[int], list[str]]]:
+        """The number of operand sets `family` can render, and a function rendering the i-th in sampling order."""
+        seed, lower = self.seed, self.lower
+        width = self.upper - lower + 1
+        match family:
+            case "natural_number":
+                size = width
+                operand = lambda j: j + lower
+                render = lambda n: natural_number_examples(n, CounterRandom(seed, "natural_number", n))
+            case "number_theory":
+                lower = max(lower, 1)
+                size = max(min(self.upper, MAX_SIEVE_LIMIT) - lower + 1, 0)
+                operand = lambda j: j + lower
+                render = lambda n: NUMBER_THEORY.render(_number_theory_values(n), NUMBER_THEORY.rnd_for(seed, n))
+            case "general_facts":
+                size = 1
+                operand = lambda j: None
+                render = lambda _: general_facts(CounterRandom(seed, "general_facts"))
+            case "a_divided_by_b":
+                # Like the corpus, division only covers non-negative pairs.
+                size = width * width
+                operand = lambda j: (j // width + lower, j % width + lower)
+                render = functools.partial(_render_pair_family, family, seed)
+            case _:
+                # Pairs of magnitudes in [lower, upper], each with one of the four sign combinations
+                size = 4 * width * width
+
+                def operand(j: int) -> tuple[int, int]:
+                    a, b = divmod(j >> 2, width)
+                    return (-1 if j & 1 else 1) * (a + lower), (-1 if j & 2 else 1) * (b + lower)
+
+                render = functools.partial(_render_pair_family, family, seed)
+        if size <= 0:
+            return 0, lambda j: []
+        permutation = KeyedPermutation(size, _hash_key(seed, "mixture", family))
+        return size, lambda j: render(operand(permutation(j)))
+
+
+class PairArithmetic(NamedTuple):
+    """Everything the pair templates derive from (a, b). The ab_ fields describe a / b and the ba_ fields b / a."""
+    a: int
+    b: int
+    ab_sum: int
+    ab_difference: int
+    ab_product: int
+    ab_gcd: int
+    ab_lcm: int
+    ab_quotient: int
+    ab_remainder: int
+    ab_rb_gcd: int
+    ab_terminating: bool
+    ab_float: float
+    ba_quotient: int
+    ba_remainder: int
+    ba_rb_gcd: int
+    ba_terminating: bool
+    ba_float: float
+
+
+class PowerTable:
+    """n⁰..n^max_power as decimal strings, in scientific notation past `max_digits` digits."""
+
+    def __init__(self, n: int, max_power: int = 20, max_digits: int = 1000):
+        self.values: list[int | None] = []
+        self.strings: list[str] = []
+        self.exact: list[bool] = []
+        if sys.get_int_max_str_digits():
+            # Longer ints can't be converted to str at all.
+            max_digits = min(max_digits, sys.get_int_max_str_digits())
+        limit = 10 ** max_digits
+        value = 1
+        for power in range(max_power + 1):
+            if value is not None:
+                if -limit < value < limit:
+                    self.values.append(value)
+                    self.strings.append(str(value))
+                    self.exact.append(True)
+                    value *= n
+                    continue
+                value = None
+            self.values.append(None)
+            self.strings.append(_scientific(power * math.log10(abs(n)), negative=n < 0 and power % 2 == 1))
+            self.exact.append(False)
+
+    def fits_float(self, power: int) -> bool:
+        """Whether n^power times a small constant like 4π still converts to a finite float."""
+        return self.exact[power] and self.values[power].bit_length() < 1000
+
+
+class NumberTheoryTable:
+    """A smallest-prime-factor sieve over 0..limit, where 0 marks a prime; Miller-Rabin answers past the limit."""
+
+    def __init__(self, limit: int):
+        self.limit = max(limit, 1)
+        root = math.isqrt(self.limit)
+        small_primes = [p for p in range(2, root + 1) if is_prime(p)]
+        self.spf = array("H" if root < 1 << 16 else "I", bytes(2 if root < 1 << 16 else 4) * (self.limit + 1))
+        # Write multiples of the largest primes first so the smallest prime factor is the one left standing.
+        for p in reversed(small_primes):
+            self.spf[p * p::p] = array(self.spf.typecode, [p]) * len(range(p * p, self.limit + 1, p))
+
+    def is_prime(self, n: int) -> bool:
+        if n > self.limit:
+            return _miller_rabin(n)
+        return n >= 2 and self.spf[n] == 0
+
+    def smallest_prime_factor(self, n: int) -> int:
+        if n > self.limit:
+            if _miller_rabin(n):
+                return n
+            return next(p for p in range(2, math.isqrt(n) + 1) if n % p == 0)
+        return self.spf[n] or n
+
+    def factorize(self, n: int) -> list[tuple[int, int]]:
+        """Prime factors of n > 0 with their exponents, smallest first."""
+        factors = []
+        while n > 1:
+            p = self.smallest_prime_factor(n)
+            exponent = 0
+            while n % p == 0:
+                n //= p
+                exponent += 1
+            factors.append((p, exponent))
+        return factors
+
+    def divisors(self, n: int) -> list[int]:
+        divisors = [1]
+        for p, exponent in self.factorize(n):
+            divisors = [d * p ** e for d in divisors for e in range(exponent + 1)]
+        return sorted(divisors)
+
+    def num_divisors(self, n: int) -> int:
+        return math.prod(exponent + 1 for _, exponent in self.factorize(n))
+
+    def sum_of_divisors(self, n: int) -> int:
+        return math.prod((p ** (exponent + 1) - 1) // (p - 1) for p, exponent in self.factorize(n))
+
+    def totient(self, n: int) -> int:
+        return math.prod((p - 1) * p ** (exponent - 1) for p, exponent in self.factorize(n))
+
+
+class NumberRenderer:
+    """Renders the text forms of integers, caching repeats and optionally loading a precomputed table."""
+    FORMS = ("plain", "parenthesized", "word", "ordinal", "superscript", "subscript")
+
+    def __init__(self, max_size: int = 1 << 16, table_path: str | None = None):
+        self.max_size = max_size
+        self.table: dict[str, dict[int, str]] = {form: {} for form in self.FORMS}
+        self._lru = {
+            "plain": functools.lru_cache(max_size)(str),
+            "parenthesized": functools.lru_cache(max_size)(lambda n: f"({n})" if n < 0 else str(n)),
+            "word": functools.lru_cache(max_size)(lambda n: _num2words(n)),
+            "ordinal": functools.lru_cache(max_size)(lambda n: _num2words(n, to="ordinal")),
+            "superscript": functools.lru_cache(max_size)(
+                lambda n: "".join(SUPERSCRIPT_MAP.get(char, char) for char in str(n))),
+            "subscript": functools.lru_cache(max_size)(
+                lambda n: "".join(SUBSCRIPT_MAP.get(char, char) for char in str(n))),
+        }
+        if table_path is not None:
+            self.load(table_path)
+
+    def render(self, form: str, n: int) -> str:
+        rendered = self.table[form].get(n)
+        return self._lru[form](n) if rendered is None else rendered
+
+    def plain(self, n: int) -> str:
+        return self.render("plain", n)
+
+    def parenthesized(self, n: int) -> str:
+        return self.render("parenthesized", n)
+
+    def word(self, n: int) -> str:
+        return self.render("word", n)
+
+    def ordinal(self, n: int) -> str:
+        return self.render("ordinal", n)
+
+    def superscript(self, n: int) -> str:
+        return self.render("superscript", n)
+
+    def subscript(self, n: int) -> str:
+        return self.render("subscript", n)
+
+    def precompute(self, numbers: Iterable[int], forms: Iterable[str] = FORMS):
+        """Pins every requested form of `numbers` in the table, outside the LRU."""
+        forms = tuple(forms)
+        for n in numbers:
+            for form in forms:
+                self.table[form][n] = self._lru[form](n)
+
+    def load(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            for form, rendered in json.load(f).items():
+                self.table[form].update((int(n), s) for n, s in rendered.items())
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.table, f, ensure_ascii=False)
+
+
+# Shared by the example functions. Point CURRICULUM_NUMBER_TABLE at a table written by NumberRenderer.save so every
+# process, including pool workers, starts warm.
+RENDERER = NumberRenderer(table_path=os.environ.get("CURRICULUM_NUMBER_TABLE"))
+
+# Shared smallest-prime-factor sieve; grown on demand by number_theory_table.
+_number_theory: NumberTheoryTable | None = None
+
+# Set by collect_stats while generation is being instrumented.
+_stats: GenerationStats | None = None
+
+
+# Powers of n go up to n^MAX_POWER. Powers with more than MAX_POWER_DIGITS digits are written in scientific
+# notation, which also keeps them clear of Python's int-to-str digit limit.
+MAX_POWER = 20
+MAX_POWER_DIGITS = 1000
+
+# The shared number theory sieve covers at most this range (64 MiB of 16-bit entries).
+MAX_SIEVE_LIMIT = 1 << 25
+# Witnesses that make Miller-Rabin exact below 3.3 * 10²⁴ (Sorenson and Webster)
+_MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+DIVISION_SIGNS = ("/", "⁄", "÷")
+MULTIPLICATION_SIGNS = ("*", "×", "x", "·")
+# Named slots are drawn once per rendered statement, so every occurrence in a template gets the same choice.
+TEMPLATE_SLOTS = {
+    "div": DIVISION_SIGNS,
+    "frac_div": ("/", "⁄"),
+    "mul": MULTIPLICATION_SIGNS,
+    "euclid": ("In Euclidean space", "In 2-dimensional Euclidean space"),
+    "euclid3": ("In Euclidean space", "In 3-dimensional Euclidean space"),
+}
+
+# The statement families rendered for each kind of work unit. Incremental builds record these, since a corpus built
+# before a family existed would be missing it for the operands already done.
+SHARD_FAMILIES = {
+    "numbers": ("natural_number", "number_theory"),
+    "pairs": ("a_plus_b", "a_minus_b", "a_times_b", "a_divided_by_b"),
+    "facts": ("general_facts",),
+}
+
+
+class DocumentTag(NamedTuple):
+    """
+    What a generated document states: its family, the template that rendered it (the family name for the
+    hand-written families), the operands it was rendered for, and the values the template was filled in from.
+    """
+    family: str
+    template_id: str
+    operands: tuple[int, ...]
+    values: dict
+
+
+class Template(NamedTuple):
+    """A compiled statement template; instances with equal `key(values)` render the same text."""
+    id: str
+    source: str
+    render: Callable[[dict, Callable[[], float]], str]
+    key: Callable[[dict], tuple]
+
+
+class TemplateGroup(NamedTuple):
+    """Templates sharing a guard. `render` builds every statement in the group with one call."""
+    guard: Callable[[dict], bool] | None
+    templates: tuple[Template, ...]
+    render: Callable[[dict, Callable[[], float]], list[str]]
+
+
+class TemplateFamily(NamedTuple):
+    """
+    A statement family compiled from declarative templates. `values` turns operands into the dict templates render
+    from, and each group's guard is checked once per operand set before its templates are rendered.
+    """
+    name: str
+    values: Callable[..., dict]
+    groups: tuple[TemplateGroup, ...]
+
+    def render(self, values: dict, rnd: Callable[[], float]) -> list[str]:
+        if _stats is not None:
+            return self._render_instrumented(values, rnd)
+        stmts = []
+        for guard, _, render in self.groups:
+            if guard is None or guard(values):
+                stmts += render(values, rnd)
+        return stmts
+
+    def render_distinct(self, instances: Iterable[tuple[dict, Callable[[], float]]], seen: set[tuple]) -> list[str]:
+        """
+        Renders (values, rnd) instances, skipping every template instance whose key is already in `seen` and adding
+        the keys of those rendered. Pass one `seen` to the renders of operand sets that share statements.
+        """
+        stats = _stats
+        start = time.perf_counter() if stats is not None else 0.0
+        stmts = []
+        for values, rnd in instances:
+            for guard, templates, _ in self.groups:
+                if guard is None or guard(values):
+                    for template in templates:
+                        if (key := template.key(values)) in seen:
+                            continue
+                        seen.add(key)
+                        if stats is None:
+                            stmts.append(template.render(values, rnd))
+                            continue
+                        t = time.perf_counter()
+                        stmts.append(doc := template.render(values, rnd))
+                        stats.record_template(template.id, doc, time.perf_counter() - t)
+        if stats is not None:
+            stats.record_call(self.name, stmts, time.perf_counter() - start)
+        return stmts
+
+    def render_tagged(self, values: dict, rnd: Callable[[], float],
+                      operands: tuple[int, ...]) -> list[tuple[str, DocumentTag]]:
+        """Like render, but one template at a time so each statement can be tagged. The variants drawn are the same."""
+        return [(template.render(values, rnd), DocumentTag(self.name, template.id, operands, values))
+                for guard, templates, _ in self.groups if guard is None or guard(values) for template in templates]
+
+    def rnd_for(self, seed: int | None, *key) -> Callable[[], float]:
+        """Variant draws for one render: the global RNG when unseeded, else a stream keyed by family and operands."""
+        return random.random if seed is None else _counter_stream(_hash_key(seed, self.name, *key))
+
+    @property
+    def templates(self) -> list[Template]:
+        return [template for group in self.groups for template in group.templates]
+
+    def _render_instrumented(self, values: dict, rnd: Callable[[], float]) -> list[str]:
+        """Like render, but one template at a time so each can be timed. The variants drawn are the same."""
+        stats = _stats
+        start = time.perf_counter()
+        stmts = []
+        for guard, templates, _ in self.groups:
+            if guard is None or guard(values):
+                for template in templates:
+                    t = time.perf_counter()
+                    doc = template.render(values, rnd)
+                    stats.record_template(template.id, doc, time.perf_counter() - t)
+                    stmts.append(doc)
+        stats.record_call(self.name, stmts, time.perf_counter() - start)
+        return stmts
+
+
+def compile_family(name: str, values: Callable[..., dict],
+                   groups: list[tuple[Callable[[dict], bool] | None, list[str]]]) -> TemplateFamily:
+    """
+    Compiles template source into a TemplateFamily. In template source, `{field}` is a value or a named slot from
+    TEMPLATE_SLOTS, and `[x|y|z]` is an inline choice drawn independently at each occurrence.
+    """
+    namespace = {f"_slot_{slot}": options for slot, options in TEMPLATE_SLOTS.items()}
+    compiled = []
+    num_templates = 0
+    for guard, sources in groups:
+        templates = []
+        for source in sources:
+            expr = _compile_template(source, namespace)
+            template_id = f"{name}.{num_templates}"
+            templates.append(Template(template_id, source, _compile_lambda(expr, template_id, namespace),
+                                      eval(f"lambda v: {_compile_key(source)}")))
+            num_templates += 1
+        render = _compile_lambda(f"[{', '.join(_compile_template(t.source, namespace) for t in templates)}]",
+                                 f"{name}.group{len(compiled)}", namespace)
+        compiled.append(TemplateGroup(guard, tuple(templates), render))
+    return TemplateFamily(name, values, tuple(compiled))
+
+
+def _compile_lambda(expr: str, name: str, namespace: dict) -> Callable:
+    # Compiled under a file name of "<template id>", so profilers attribute time to the template it came from.
+    return eval(compile(f"lambda v, rnd: {expr}", f"<{name}>", "eval"), namespace)
+
+
+def _compile_key(source: str) -> str:
+    """Translates template source into a tuple expression over `v` that keys the statement it renders."""
+    fields = [field for field in re.findall(r"\{(\w+)}", source) if field not in TEMPLATE_SLOTS]
+    skeleton = re.sub(r"\{(\w+)}", lambda m: m[0] if m[1] in TEMPLATE_SLOTS else "{}", source)
+    return f"({skeleton!r}, {''.join(f'v[{field!r}], ' for field in fields)})"
+
+
+def _compile_template(source: str, namespace: dict) -> str:
+    """Translates template source into an f-string expression over `v` (values) and `rnd` (a uniform [0, 1) RNG)."""
+    parts = []
+    drawn = set()
+    for literal, field, choice in re.findall(r"([^{\[]*)(?:\{(\w+)}|\[([^]]*)]|$)", source):
+        parts.append(literal.replace("\\", "\\\\").replace('"', '\\"').replace("{", "{{").replace("}", "}}"))
+        if field in TEMPLATE_SLOTS:
+            if field in drawn:
+                parts.append(f"{{_{field}}}")
+            else:
+                drawn.add(field)
+                parts.append(f"{{(_{field} := _slot_{field}[int(rnd() * {len(TEMPLATE_SLOTS[field])})])}}")
+        elif field:
+            parts.append(f"{{v[{field!r}]}}")
+        elif choice:
+            options = tuple(choice.split("|"))
+            key = f"_choice_{len(namespace)}"
+            namespace[key] = options
+            parts.append(f"{{{key}[int(rnd() * {len(options)})]}}")
+    return 'f"' + "".join(parts) + '"'
+
+
+def _a_divided_by_b_values(a, b, q, r, f, ab_gcd=None, rb_gcd=None, terminating=None) -> dict:
+    if ab_gcd is None:
         ab_gcd = math.gcd(a, b)
-        a_simplified = a // ab_gcd
-        b_simplified = b // ab_gcd
+    if rb_gcd is None:
         rb_gcd = math.gcd(r, b)
-        r_simplified = r // rb_gcd
-        r_b_simplified = b // rb_gcd
-        stmts += [
-            f"The greatest common divisor of {a} and {b} is {ab_gcd}.",
-            f"The ratio of {a} to {b} is {a_simplified}:{b_simplified}.",
-            f"{a} % {b} = {r}",
-            f"{a} // {b} = {q}",
-            f"{a} divided by {b} {random.choice(['equals', 'is'])} {q} with a remainder of {r}.",
-            f"{a} divided by {b} {random.choice(['equals', 'is'])} {q}{to_superscript(r_simplified)}⁄{to_subscript(r_b_simplified)}.",
-            f"{a} ⁄ {b} = {q}{to_superscript(r_simplified)}⁄{to_subscript(r_b_simplified)}",
-            f"{b} goes into {a}, {q} times with a remainder of {r}.",
-            f"{b} is not a factor of {a}.",
-        ]
-        if is_denominator_of_terminating_decimal(r_b_simplified):
-            stmts += [
-                f"The ratio of {a} to {b} is {f}.",
-                f"{a} divided by {b} {random.choice(['equals', 'is'])} {f}.",
-                f"{a} {random_division_sign()} {b} = {f}",
-                f"{q}{to_superscript(r_simplified)}⁄{to_subscript(r_b_simplified)} = {f}",
-            ]
-        else:
-            stmts += [
-                f"The ratio of {a} to {b} is {random.choice(['approximately', 'roughly'])} {f}.",
-                f"{a} divided by {b} is {random.choice(['approximately', 'roughly'])} {f}.",
-                f"{a} {random_division_sign()} {b} ≈ {f}",
-                f"{q}{to_superscript(r_simplified)}⁄{to_subscript(r_b_simplified)} ≈ {f}",
-            ]
-    return stmts
+    if terminating is None:
+        terminating = is_denominator_of_terminating_decimal(b // rb_gcd)
+    values = {"a": a, "b": b, "q": q, "r": r, "f": f, "ab_gcd": ab_gcd, "terminating": terminating}
+    if q == 0 and r > 0:
+        values["case"] = "fraction"
+        values["perc"] = f * 100
+    elif r == 0:
+        values["case"] = "perfect"
+        values["q_word"] = RENDERER.word(q)
+        values["q_ordinal"] = RENDERER.ordinal(q)
+        return values
+    else:
+        values["case"] = "euclidean"
+        values["rs_sup"] = RENDERER.superscript(r // rb_gcd)
+        values["rbs_sub"] = RENDERER.subscript(b // rb_gcd)
+    a_simplified = a // ab_gcd
+    b_simplified = b // ab_gcd
+    values.update(
+        a_simplified=a_simplified, b_simplified=b_simplified,
+        a_sup=RENDERER.superscript(a), b_sub=RENDERER.subscript(b), r_sup=RENDERER.superscript(r),
+        as_sup=RENDERER.superscript(a_simplified), bs_sub=RENDERER.subscript(b_simplified),
+    )
+    return values
+
+
+def _a_minus_b_values(a, b, c) -> dict:
+    return {"a": a, "b": b, "c": c, "abs_c": abs(c), "pa": RENDERER.parenthesized(a), "pb": RENDERER.parenthesized(b)}
+
+
+def _a_plus_b_values(a, b, c) -> dict:
+    return {"a": a, "b": b, "c": c, "perimeter": 2 * c,
+            "pa": RENDERER.parenthesized(a), "pb": RENDERER.parenthesized(b)}
+
+
+def _a_times_b_values(a, b, c, ab_lcm=None) -> dict:
+    return {"a": a, "b": b, "c": c, "ab_lcm": math.lcm(a, b) if ab_lcm is None else ab_lcm,
+            "half_c": c / 2 if c % 2 != 0 else c // 2,
+            "pa": RENDERER.parenthesized(a), "pb": RENDERER.parenthesized(b)}
+
+
+def _number_theory_values(n) -> dict:
+    table = number_theory_table(n)
+    factors = table.factorize(n)
+    num_divisors = math.prod(e + 1 for _, e in factors)
+    divisors = table.divisors(n) if num_divisors <= 12 else []
+    return {
+        "n": n,
+        "prime": len(factors) == 1 and factors[0][1] == 1,
+        "factors_sup": " × ".join(f"{p}{RENDERER.superscript(e)}" if e > 1 else str(p) for p, e in factors),
+        "factors_caret": " * ".join(f"{p}^{e}" if e > 1 else str(p) for p, e in factors),
+        "num_divisors": num_divisors,
+        "divisor_list": ", ".join(map(str, divisors[:-1])) + (", and " if len(divisors) > 2 else " and ") + str(n),
+        "sum_of_divisors": table.sum_of_divisors(n),
+        "totient": table.totient(n),
+    }
+
+
+# Given that a / b = q + r/b, which has a float value of f.
+A_DIVIDED_BY_B = compile_family("a_divided_by_b", _a_divided_by_b_values, [
+    # Fraction
+    (lambda v: v["case"] == "fraction", [
+        "The greatest common divisor of {a} and {b} is {ab_gcd}.",
+        "{a} % {b} = {r}",
+        "{a} // {b} = 0",
+        "{a} ÷ {b} = {a}{frac_div}{b}",
+    ]),
+    (lambda v: v["case"] == "fraction" and v["ab_gcd"] != 1, [  # Can be reduced
+        "The ratio of {a} to {b} is {a_simplified}:{b_simplified}.",
+        "{a} {frac_div} {b} = {a_simplified}{frac_div}{b_simplified}",
+        "{a}{frac_div}{b} = {a_simplified}{frac_div}{b_simplified}",
+        "{a}{frac_div}{b} [reduces|simplifies] to {a_simplified}{frac_div}{b_simplified}.",
+        "{a_sup}⁄{b_sub} = {as_sup}⁄{bs_sub}",
+        "{a_sup}⁄{b_sub} [reduces|simplifies] to {as_sup}⁄{bs_sub}.",
+    ]),
+    (lambda v: v["case"] == "fraction" and v["ab_gcd"] == 1, [
+        "{a} {frac_div} {b} = {a}{frac_div}{b}",
+        "{a} ⁄ {b} = {a_sup}⁄{b_sub}",
+    ]),
+    (lambda v: v["case"] == "fraction" and v["terminating"], [
+        "The ratio of {a} to {b} is {f}.",
+        "{a_simplified}/{b_simplified} = {perc}%",
+        "{a} divided by {b} [equals|is] {f}.",
+        "{a} {div} {b} = {f}",
+        "{a}/{b} = {perc}%",
+        "{a_sup}⁄{b_sub} = {perc}%",
+        "{as_sup}⁄{bs_sub} = {perc}%",
+        "{r_sup}⁄{b_sub} = {f}",
+    ]),
+    (lambda v: v["case"] == "fraction" and not v["terminating"], [
+        "The ratio of {a} to {b} is [approximately|roughly] {f}.",
+        "{a_simplified}/{b_simplified} ≈ {perc}%",
+        "{a} divided by {b} [equals|is] [approximately|roughly] {f}.",
+        "{a} {div} {b} ≈ {f}",
+        "{a}/{b} ≈ {perc}%",
+        "{a_sup}⁄{b_sub} ≈ {perc}%",
+        "{as_sup}⁄{bs_sub} ≈ {perc}%",
+        "{r_sup}⁄{b_sub} ≈ {f}",
+    ]),
+    # Perfect division
+    (lambda v: v["case"] == "perfect" and v["q"] == 2, [
+        "{a} is [double|twice|twice as much as] {b}.",
+        "{b} is [half|half as much as|half of] {a}.",
+    ]),
+    (lambda v: v["case"] == "perfect" and v["q"] == 3, ["{a} is triple {b}."]),
+    (lambda v: v["case"] == "perfect" and v["q"] == 4, ["{a} is quadruple {b}."]),
+    (lambda v: v["case"] == "perfect", [
+        "The quotient of {a} and {b} [equals|is] {q}.",
+        "The ratio of {a} to {b} is {q}.",
+        "{a} divided by {b} [equals|is] {q}.",
+        "{a} [is divisible by|is a multiple of] {b}.",
+        "{a} {div} {b} = {q}",
+    ]),
+    (lambda v: v["case"] == "perfect" and v["a"] != 0, [
+        "{a} is {q_word} [times|times as much as] {b}.",
+        "{b} goes into {a}, {q} times.",
+        "{b} [divides|is a divisor of|is a factor of] {a}.",
+        "{q} [divides|is a divisor of|is a factor of] {a}.",
+    ]),
+    (lambda v: v["case"] == "perfect" and v["a"] != 0 and v["q"] > 2, ["{b} is one-{q_ordinal} of {a}."]),
+    (lambda v: v["case"] == "perfect" and v["q"] != 0, ["{a} [is divisible by|is a multiple of] {q}."]),
+    # Euclidean division
+    (lambda v: v["case"] == "euclidean", [
+        "The greatest common divisor of {a} and {b} is {ab_gcd}.",
+        "The ratio of {a} to {b} is {a_simplified}:{b_simplified}.",
+        "{a} % {b} = {r}",
+        "{a} // {b} = {q}",
+        "{a} divided by {b} [equals|is] {q} with a remainder of {r}.",
+        "{a} divided by {b} [equals|is] {q}{rs_sup}⁄{rbs_sub}.",
+        "{a} ⁄ {b} = {q}{rs_sup}⁄{rbs_sub}",
+        "{b} goes into {a}, {q} times with a remainder of {r}.",
+        "{b} is not a factor of {a}.",
+    ]),
+    (lambda v: v["case"] == "euclidean" and v["terminating"], [
+        "The ratio of {a} to {b} is {f}.",
+        "{a} divided by {b} [equals|is] {f}.",
+        "{a} {div} {b} = {f}",
+        "{q}{rs_sup}⁄{rbs_sub} = {f}",
+    ]),
+    (lambda v: v["case"] == "euclidean" and not v["terminating"], [
+        "The ratio of {a} to {b} is [approximately|roughly] {f}.",
+        "{a} divided by {b} is [approximately|roughly] {f}.",
+        "{a} {div} {b} ≈ {f}",
+        "{q}{rs_sup}⁄{rbs_sub} ≈ {f}",
+    ]),
+])
+
+# Given that a - b = c.
+A_MINUS_B = compile_family("a_minus_b", _a_minus_b_values, [
+    (None, [
+        "Subtract {b} from {a} to get {c}.",
+        "Subtracting {b} from {a} [gets|results in|yields] {c}.",
+        "{a} minus {b} [equals|is] {c}.",
+    ]),
+    (lambda v: v["a"] > v["b"], ["The absolute difference between {a} and {b} [equals|is] {abs_c}."]),
+    (lambda v: v["b"] > 0, [
+        "Decrease {a} by {b} to get {c}.",
+        "Decreasing {a} by {b} [gets|results in|yields] {c}.",
+        "Take {b} away from {a} to get {c}.",
+        "Taking {b} away from {a} [gets|results in|yields] {c}.",
+        "{c} equals {a} minus {b}.",
+        "{c} is {b} less than {a}.",
+    ]),
+    (None, ["{pa} - {pb} = {c}"]),
+])
+
+# Given that a + b = c.
+A_PLUS_B = compile_family("a_plus_b", _a_plus_b_values, [
+    (None, [
+        "Add {a} to {b} to get {c}.",
+        "Add {b} to {a} to get {c}.",
+        "Adding {a} and {b} [gets|makes|results in|yields] {c}.",
+        "Adding {b} and {a} [gets|makes|results in|yields] {c}.",
+        "Subtract {a} from {c} to get {b}.",
+        "Subtract {b} from {c} to get {a}.",
+        "Subtracting {a} from {c} [gets|makes|results in|yields] {b}.",
+        "Subtracting {b} from {c} [gets|makes|results in|yields] {a}.",
+        "The result of summing {a} and {b} is {c}.",
+        "The result of summing {b} and {a} is {c}.",
+        "The [sum|total] of {a} and {b} [equals|is] {c}.",
+        "The [sum|total] of {b} and {a} [equals|is] {c}.",
+        "{a} [added to|plus] {b} [equals|is|makes] {c}.",
+        "{b} [added to|plus] {a} [equals|is|makes] {c}.",
+        "{c} is obtained by adding {a} and {b}.",
+        "{c} is obtained by adding {b} and {a}.",
+        "{c} [equals|is] the sum of {a} and {b}.",
+        "{c} [equals|is] the sum of {b} and {a}.",
+    ]),
+    (lambda v: v["a"] > 0, [
+        "Increase {b} by {a} to get {c}.",
+        "Increasing {b} by {a} [gets|results in|yields] {c}.",
+        "{c} is {a} more than {b}.",
+        "{c} [equals|is] {b} [increased by|plus] {a}.",
+    ]),
+    (lambda v: v["b"] > 0, [
+        "Increase {a} by {b} to get {c}.",
+        "Increasing {a} by {b} [gets|results in|yields] {c}.",
+        "{c} is {b} more than {a}.",
+        "{c} [equals|is] {a} [increased by|plus] {b}.",
+    ]),
+    (lambda v: v["a"] > 0 and v["b"] > 0, [
+        "{euclid}, a rectangle with a width of {a} and a height of {b} has a perimeter [of|equal to] {perimeter}.",
+        "{euclid}, a rectangle with a width of {b} and a height of {a} has a perimeter [of|equal to] {perimeter}.",
+    ]),
+    (None, [
+        "{pa} + {pb} = {c}",
+        "{pb} + {pa} = {c}",
+        "{c} - {pa} = {pb}",
+        "{c} - {pb} = {pa}",
+    ]),
+])
 
+# Given that a * b = c.
+A_TIMES_B = compile_family("a_times_b", _a_times_b_values, [
+    (None, [
+        "Multiply {a} [and|by] {b} to get {c}.",
+        "Multiply {b} [and|by] {a} to get {c}.",
+        "Multiplying {a} and {b} [gets|results in|yields] {c}.",
+        "Multiplying {b} and {a} [gets|results in|yields] {c}.",
+        "The product of {a} and {b} [equals|is] {c}.",
+        "The product of {b} and {a} [equals|is] {c}.",
+        "{a} times {b} [equals|is] {c}.",
+        "{b} times {a} [equals|is] {c}.",
+        "{c} [equals|is] {a} [multiplied by|times] {b}.",
+        "{c} [equals|is] {b} [multiplied by|times] {a}.",
+    ]),
+    (lambda v: v["a"] > 0, [
+        "Divide {c} by {a} to get {b}.",
+        "Dividing {c} by {a} [gets|results in|yields] {b}.",
+        "The quotient of {c} and {a} [equals|is] {b}.",
+        "{b} repeated {a} times [equals|is] {c}.",
+        "{c} divided by {a} [equals|is] {b}.",
+        "{c} {div} {a} = {b}",
+    ]),
+    (lambda v: v["b"] > 0, [
+        "Divide {c} by {b} to get {a}.",
+        "Dividing {c} by {b} [gets|results in|yields] {a}.",
+        "The quotient of {c} and {b} [equals|is] {a}.",
+        "{a} repeated {b} times [equals|is] {c}.",
+        "{c} divided by {b} [equals|is] {a}.",
+        "{c} {div} {b} = {a}",
+    ]),
+    (lambda v: v["a"] > 0 and v["b"] > 0, [
+        "Scale {a} by a factor of {b} to get {c}.",
+        "The least common multiple of {a} and {b} [equals|is] {ab_lcm}.",
+        "{b} groups of {a} [equals|is] {c}.",
+        "{euclid}, a rectangle with a width of {a} and a height of {b} has an area [of|equal to] {c}.",
+        "{euclid}, a triangle with a base of {a} and a height of {b} has an area [of|equal to] {half_c}.",
+    ]),
+    (None, [
+        "{pa} {mul} {pb} = {c}",
+        "{pb} {mul} {pa} = {c}",
+    ]),
+])
 
-def a_minus_b_examples(a, b, c) -> list[str]:
+
+# Given a natural number n > 0.
+NUMBER_THEORY = compile_family("number_theory", _number_theory_values, [
+    (lambda v: v["n"] > 1 and not v["prime"], [
+        "The prime factorization of {n} is {factors_sup}.",
+        "{n} = {factors_sup}",
+        "{n} = {factors_caret}",
+        "{n} is a composite number.",
+    ]),
+    (lambda v: v["n"] > 1 and v["num_divisors"] <= 12, ["The [divisors|positive divisors] of {n} are {divisor_list}."]),
+    (lambda v: v["n"] > 1, [
+        "{n} has {num_divisors} positive divisors.",
+        "The sum of the divisors of {n} [equals|is] {sum_of_divisors}.",
+    ]),
+    (None, [
+        "Euler's totient of {n} [equals|is] {totient}.",
+        "φ({n}) = {totient}",
+    ]),
+    (lambda v: v["totient"] > 1, ["There [are|exist] {totient} positive integers up to {n} that are coprime to {n}."]),
+])
+
+
+def a_divided_by_b_examples(a, b, q, r, f,
+                            ab_gcd: int | None = None,
+                            rb_gcd: int | None = None,
+                            terminating: bool | None = None,
+                            rng: random.Random | None = None) -> list[str]:
+    """
+    Generates examples, given that a / b = q + r/b, which has a float value of f. `ab_gcd`, `rb_gcd` and
+    `terminating` (whether a / b has a terminating decimal) are computed here unless precomputed by pair_arithmetic.
+    """
+    return A_DIVIDED_BY_B.render(_a_divided_by_b_values(a, b, q, r, f, ab_gcd, rb_gcd, terminating),
+                                 random.random if rng is None else rng.random)
+
+
+def a_minus_b_examples(a, b, c, rng: random.Random | None = None) -> list[str]:
     """Generates examples, given that a - b = c."""
-    stmts = [
-        f"Subtract {b} from {a} to get {c}.",
-        f"Subtracting {b} from {a} {random.choice(['gets', 'results in', 'yields'])} {c}.",
-        f"{a} minus {b} {random.choice(['equals', 'is'])} {c}.",
-    ]
-    if a > b:
-        stmts.append(f"The absolute difference between {a} and {b} {random.choice(['equals', 'is'])} {abs(c)}.")
-    if b > 0:
-        stmts += [
-            f"Decrease {a} by {b} to get {c}.",
-            f"Decreasing {a} by {b} {random.choice(['gets', 'results in', 'yields'])} {c}.",
-            f"Take {b} away from {a} to get {c}.",
-            f"Taking {b} away from {a} {random.choice(['gets', 'results in', 'yields'])} {c}.",
-            f"{c} equals {a} minus {b}.",
-            f"{c} is {b} less than {a}.",
-        ]
-    a, b = parenthesize_if_negative(a, b)
-    stmts.append(f"{a} - {b} = {c}")
-    return stmts
+    return A_MINUS_B.render(_a_minus_b_values(a, b, c), random.random if rng is None else rng.random)
 
 
-def a_plus_b_examples(a, b, c) -> list[str]:
+def a_plus_b_examples(a, b, c, rng: random.Random | None = None) -> list[str]:
     """Generates examples, given that a + b = c."""
-    stmts = [
-        f"Add {a} to {b} to get {c}.",
-        f"Add {b} to {a} to get {c}.",
-        f"Adding {a} and {b} {random.choice(['gets', 'makes', 'results in', 'yields'])} {c}.",
-        f"Adding {b} and {a} {random.choice(['gets', 'makes', 'results in', 'yields'])} {c}.",
-        f"Subtract {a} from {c} to get {b}.",
-        f"Subtract {b} from {c} to get {a}.",
-        f"Subtracting {a} from {c} {random.choice(['gets', 'makes', 'results in', 'yields'])} {b}.",
-        f"Subtracting {b} from {c} {random.choice(['gets', 'makes', 'results in', 'yields'])} {a}.",
-        f"The result of summing {a} and {b} is {c}.",
-        f"The result of summing {b} and {a} is {c}.",
-        f"The {random.choice(['sum', 'total'])} of {a} and {b} {random.choice(['equals', 'is'])} {c}.",
-        f"The {random.choice(['sum', 'total'])} of {b} and {a} {random.choice(['equals', 'is'])} {c}.",
-        f"{a} {random.choice(['added to', 'plus'])} {b} {random.choice(['equals', 'is', 'makes'])} {c}.",
-        f"{b} {random.choice(['added to', 'plus'])} {a} {random.choice(['equals', 'is', 'makes'])} {c}.",
-        f"{c} is obtained by adding {a} and {b}.",
-        f"{c} is obtained by adding {b} and {a}.",
-        f"{c} {random.choice(['equals', 'is'])} the sum of {a} and {b}.",
-        f"{c} {random.choice(['equals', 'is'])} the sum of {b} and {a}.",
-    ]
-    if a > 0:
-        stmts += [
-            f"Increase {b} by {a} to get {c}.",
-            f"Increasing {b} by {a} {random.choice(['gets', 'results in', 'yields'])} {c}.",
-            f"{c} is {a} more than {b}.",
-            f"{c} {random.choice(['equals', 'is'])} {b} {random.choice(['increased by', 'plus'])} {a}.",
-        ]
-    if b > 0:
-        stmts += [
-            f"Increase {a} by {b} to get {c}.",
-            f"Increasing {a} by {b} {random.choice(['gets', 'results in', 'yields'])} {c}.",
-            f"{c} is {b} more than {a}.",
-            f"{c} {random.choice(['equals', 'is'])} {a} {random.choice(['increased by', 'plus'])} {b}.",
-        ]
-    if a > 0 and b > 0:
-        stmts += [
-            f"{random_euclidean_qualifier(capitalize=True)}, a rectangle with a width of {a} and a height of {b} has a perimeter {random.choice(['of', 'equal to'])} {2 * c}.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a rectangle with a width of {b} and a height of {a} has a perimeter {random.choice(['of', 'equal to'])} {2 * c}.",
-        ]
-    a, b = parenthesize_if_negative(a, b)
-    stmts += [
-        f"{a} + {b} = {c}",
-        f"{b} + {a} = {c}",
-        f"{c} - {a} = {b}",
-        f"{c} - {b} = {a}",
-    ]
-    return stmts
+    return A_PLUS_B.render(_a_plus_b_values(a, b, c), random.random if rng is None else rng.random)
 
 
-def a_times_b_examples(a, b, c) -> list[str]:
+def a_times_b_examples(a, b, c, ab_lcm: int | None = None, rng: random.Random | None = None) -> list[str]:
     """Generates examples, given that a * b = c."""
-    ab_lcm = math.lcm(a, b)
-    stmts = [
-        f"Multiply {a} {random.choice(['and', 'by'])} {b} to get {c}.",
-        f"Multiply {b} {random.choice(['and', 'by'])} {a} to get {c}.",
-        f"Multiplying {a} and {b} {random.choice(['gets', 'results in', 'yields'])} {c}.",
-        f"Multiplying {b} and {a} {random.choice(['gets', 'results in', 'yields'])} {c}.",
-        f"The product of {a} and {b} {random.choice(['equals', 'is'])} {c}.",
-        f"The product of {b} and {a} {random.choice(['equals', 'is'])} {c}.",
-        f"{a} times {b} {random.choice(['equals', 'is'])} {c}.",
-        f"{b} times {a} {random.choice(['equals', 'is'])} {c}.",
-        f"{c} {random.choice(['equals', 'is'])} {a} {random.choice(['multiplied by', 'times'])} {b}.",
-        f"{c} {random.choice(['equals', 'is'])} {b} {random.choice(['multiplied by', 'times'])} {a}.",
-    ]
-    if a > 0:
-        stmts += [
-            f"Divide {c} by {a} to get {b}.",
-            f"Dividing {c} by {a} {random.choice(['gets', 'results in', 'yields'])} {b}.",
-            f"The quotient of {c} and {a} {random.choice(['equals', 'is'])} {b}.",
-            f"{b} repeated {a} times {random.choice(['equals', 'is'])} {c}.",
-            f"{c} divided by {a} {random.choice(['equals', 'is'])} {b}.",
-            f"{c} {random_division_sign()} {a} = {b}",
-        ]
-    if b > 0:
-        stmts += [
-            f"Divide {c} by {b} to get {a}.",
-            f"Dividing {c} by {b} {random.choice(['gets', 'results in', 'yields'])} {a}.",
-            f"The quotient of {c} and {b} {random.choice(['equals', 'is'])} {a}.",
-            f"{a} repeated {b} times {random.choice(['equals', 'is'])} {c}.",
-            f"{c} divided by {b} {random.choice(['equals', 'is'])} {a}.",
-            f"{c} {random_division_sign()} {b} = {a}",
-        ]
-    if a > 0 and b > 0:
-        stmts += [
-            f"Scale {a} by a factor of {b} to get {c}.",
-            f"The least common multiple of {a} and {b} {random.choice(['equals', 'is'])} {ab_lcm}.",
-            f"{b} groups of {a} {random.choice(['equals', 'is'])} {c}.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a rectangle with a width of {a} and a height of {b} has an area {random.choice(['of', 'equal to'])} {c}.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a triangle with a base of {a} and a height of {b} has an area {random.choice(['of', 'equal to'])} {c / 2 if c % 2 != 0 else c // 2}.",
-        ]
-    a, b = parenthesize_if_negative(a, b)
-    stmts += [
-        f"{a} {random_multiplication_sign()} {b} = {c}",
-        f"{b} {random_multiplication_sign()} {a} = {c}",
-    ]
-    return stmts
+    return A_TIMES_B.render(_a_times_b_values(a, b, c, ab_lcm), random.random if rng is None else rng.random)
 
 
-def examples_from_natural_number_pair(pair: tuple[int, int]) -> list[str]:
-    stmts = []
-    a, b = pair
+def build_corpus(out_dir: str,
+                 upper: int,
+                 seed: int = 0,
+                 dedup: str | Dedup | DiskDedup | None = "exact",
+                 workers: int | None = None,
+                 shard_size: int = 64,
+                 writer_threads: int = 2,
+                 **writer_options) -> dict:
+    """Builds the corpus for range(upper) into `out_dir` incrementally and returns the manifest."""
+    from corpus_writer import append_corpus, load_tokenizer, read_manifest, read_shard
 
-    ab_sum = a + b
-    ab_product = a * b
+    manifest = read_manifest(out_dir)
+    progress = {"numbers": 0, "pairs": [0, 0], "facts": False}
+    seen = make_dedup(dedup, streaming=True)
+    if manifest is not None:
+        if manifest.get("seed") != seed:
+            raise ValueError(f"{out_dir} was built with seed {manifest.get('seed')}, not {seed}")
+        if manifest.get("families") != {kind: list(families) for kind, families in SHARD_FAMILIES.items()}:
+            raise ValueError(f"{out_dir} was built with different statement families; rebuild it from scratch")
+        progress = manifest["progress"] or progress
+        if progress["numbers"] >= upper and progress["pairs"][0] >= upper and progress["facts"]:
+            return manifest
+        if seen is not None:
+            tokenizer = writer_options.get("tokenizer")
+            if manifest["format"] == "tokens" and tokenizer is not None:
+                tokenizer = load_tokenizer(tokenizer)
+            for shard in manifest["shards"]:
+                for doc in read_shard(os.path.join(out_dir, shard["file"]), tokenizer):
+                    seen.add(doc)
 
-    # Addition
-    stmts += a_plus_b_examples(a, b, ab_sum)
-    stmts += a_plus_b_examples(-a, b, (-a) + b)
-    stmts += a_plus_b_examples(a, -b, a + (-b))
-    stmts += a_plus_b_examples(-a, -b, (-a) + (-b))
+    work = deque()  # Progress after each shard of work, in the order _map_shards returns them
 
-    # Subtraction
-    stmts += a_minus_b_examples(a, b, a - b)
-    stmts += a_minus_b_examples(-a, b, (-a) - b)
-    stmts += a_minus_b_examples(a, -b, a - (-b))
-    stmts += a_minus_b_examples(-a, -b, (-a) - (-b))
+    def shards() -> Iterator[tuple[str, tuple]]:
+        done = dict(progress)
+        for start in range(done["numbers"], upper, shard_size):
+            done["numbers"] = min(start + shard_size, upper)
+            work.append(dict(done))
+            yield "numbers", tuple(range(start, done["numbers"]))
+        shell, offset = done["pairs"]
+        for m in range(shell, upper):
+            size = 2 * m + 1
+            for start in range(offset if m == shell else 0, size, shard_size):
+                stop = min(start + shard_size, size)
+                done["pairs"] = [m + 1, 0] if stop == size else [m, stop]
+                work.append(dict(done))
+                yield "pairs", tuple(_pair_shell(m, start, stop))
+        if not done["facts"]:
+            done["facts"] = True
+            work.append(dict(done))
+            yield "facts", ()
 
-    # Multiplication
-    stmts += a_times_b_examples(a, b, ab_product)
-    stmts += a_times_b_examples(-a, b, (-a) * b)
-    stmts += a_times_b_examples(a, -b, a * (-b))
-    stmts += a_times_b_examples(-a, -b, (-a) * (-b))
+    def units() -> Iterator[tuple[dict, list[str]]]:
+        for docs in _map_shards(shards(), seed, workers or os.cpu_count() or 1):
+            yield work.popleft(), [doc for doc in docs if seen is None or seen.add(doc)]
 
-    if a != b:
-        stmts += a_minus_b_examples(b, a, b - a)
+    return append_corpus(units(), out_dir, manifest_extra={
+        "seed": seed, "families": {kind: list(families) for kind, families in SHARD_FAMILIES.items()},
+    }, workers=writer_threads, **writer_options)
 
-    # Division
-    if b != 0:
-        ab_quotient, ab_remainder = divmod(a, b)
-        stmts += a_divided_by_b_examples(a, b, ab_quotient, ab_remainder, a / b)
-    if a != 0:
-        ba_quotient, ba_remainder = divmod(b, a)
-        stmts += a_divided_by_b_examples(b, a, ba_quotient, ba_remainder, b / a)
 
-    # TODO: Euclidean geometry and more advanced math
-    #   - Triangles: area, hypotenuse, etc.
-    return stmts
+@contextlib.contextmanager
+def collect_stats(profile_path: str | None = None, perf: bool = False) -> Iterator[GenerationStats]:
+    """Collects GenerationStats for everything generated in this process inside the block."""
+    global _stats
+    stats = GenerationStats()
+    profiler = None
+    if profile_path is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+    if perf:
+        sys.activate_stack_trampoline("perf")
+    _stats = stats
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield stats
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if perf:
+            sys.deactivate_stack_trampoline()
+        _stats = None
 
 
-def examples_from_natural_number(n: int) -> list[str]:
-    word = num2words(n)
-    stmts = [
-        f"{n} = {n}",
-        f"{n} equals {n}.",
-        f"{n} is numerically equivalent to {word}.",
-        f"{word.capitalize()} is numerically equivalent to {n}.",
-    ]
-    is_zero = n == 0
-    if not is_zero:
-        stmts += [
-            f"{random_euclidean_qualifier(capitalize=True)}, a circle with a radius of {n} has a circumference {random.choice(['approximately', 'roughly'])} equal to {2 * n * math.pi}.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a circle with a radius of {n} has a circumference {random.choice(['of', 'equal to'])} {2 * n} {random_multiplication_sign()} π.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a circle with a radius of {n} has a diameter {random.choice(['of', 'equal to'])} {2 * n}.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a circle with a radius of {n} has an area {random.choice(['of', 'equal to'])} {random_exponent_expr(n, 2)} {random_multiplication_sign()} π.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a square with an area {random.choice(['of', 'equal to'])} {random_exponent_expr(n, 2)} has an edge length of {n}.",
-            f"{random_euclidean_qualifier(capitalize=True)}, a square with an edge length of {n} has an area {random.choice(['of', 'equal to'])} {random_exponent_expr(n, 2)}.",
-            f"{n} {random_multiplication_sign()} 1/{n} = 1",
-            f"{n} {random_multiplication_sign()} {1 / n} ≈ 1",
-            f"{n} {random_multiplication_sign()} {to_superscript(1)}⁄{to_subscript(n)} = 1",
-            f"|{-n}| = {n}",
-            f"|{n}| = {n}",
-        ]
-        if is_prime(n):
-            stmts.append(f"1 and {n} are the only divisors of {n}.")
-            stmts.append(f"{n} is a prime number.")
-    for power in range(1 if is_zero else 0, 21):
-        n_to_power = 0 if is_zero else n ** power
-        match power:
-            case 2:
-                if not is_zero:
-                    stmts += [
-                        f"{random_euclidean_qualifier(capitalize=True)}, a circle with a radius of {n} has an area {random.choice(['approximately', 'roughly'])} equal to {n_to_power * math.pi}.",
-                        f"{random_euclidean_qualifier(capitalize=True)}, a circle with a radius of {n} has an area {random.choice(['of', 'equal to'])} {n_to_power}π.",
-                        f"{random_euclidean_qualifier(capitalize=True)}, a square with a side length of {n} has an area {random.choice(['of', 'equal to'])} {n_to_power}.",
-                        f"{random_euclidean_qualifier(capitalize=True)}, a square with an area {random.choice(['of', 'equal to'])} {n_to_power} has a side length of {n}.",
-                        f"{random_euclidean_qualifier(d=3, capitalize=True)}, a sphere with a radius of {n} has a surface area {random.choice(['approximately', 'roughly'])} equal to {4  * n_to_power * math.pi}.",
-                        f"{random_euclidean_qualifier(d=3, capitalize=True)}, a sphere with a radius of {n} has a surface area {random.choice(['of', 'equal to'])} {4 * n_to_power}π.",
-                    ]
-                stmts += [
-                    f"The principal square root of {n_to_power} {random.choice(['equals', 'is'])} {n}.",
-                    f"{n} is the principal square root of {n_to_power}.",
-                    f"{n} raised to the 2nd power {random.choice(['equals', 'is'])} {n_to_power}.",
-                    f"{n} squared is {n_to_power}.",
-                ]
-            case 3:
-                if not is_zero:
-                    stmts += [
-                        f"{random_euclidean_qualifier(d=3, capitalize=True)}, a cube with an edge length of {n} has a volume {random.choice(['of', 'equal to'])} {n_to_power}.",
-                        f"{random_euclidean_qualifier(d=3, capitalize=True)}, a cube with an edge length of {n} has {random.choice(['6', 'six'])} faces, each with an area {random.choice(['of', 'equal to'])} {n ** 2}.",
-                        f"{random_euclidean_qualifier(d=3, capitalize=True)}, a sphere with a radius of {n} has a volume {random.choice(['approximately', 'roughly'])} equal to {(4/3) * n_to_power * math.pi}.",
-                        f"{random_euclidean_qualifier(d=3, capitalize=True)}, a sphere with a radius of {n} has a volume {random.choice(['of', 'equal to'])} {(4/3) * n_to_power}π.",
-                    ]
-                stmts += [
-                    f"The cube root of {n_to_power} {random.choice(['equals', 'is'])} {n}.",
-                    f"{n} cubed {random.choice(['equals', 'is'])} {n_to_power}.",
-                    f"{n} is the cube root of {n_to_power}.",
-                    f"{n} raised to the 3rd power {random.choice(['equals', 'is'])} {n_to_power}.",
-                ]
-        if power > 1:
-            power_ordinal = num2words(power, to='ordinal')
-            stmts += [
-                f"The {power_ordinal} root of {n_to_power} {random.choice(['equals', 'is'])} {n}.",
-                f"{n} is the {power_ordinal} root of {n_to_power}.",
-                f"{n} raised to the {power_ordinal} power {random.choice(['equals', 'is'])} {n_to_power}.",
-                f"{n} to the power of {power} {random.choice(['equals', 'is'])} {n_to_power}.",
-            ]
-            if power > 3:
-                stmts.append(f"{n} raised to the {power}th power {random.choice(['equals', 'is'])} {n_to_power}.")
-        stmts += [
-            f"{random_exponent_expr(n, power)} = {n_to_power}",
-            f"{random_exponent_expr(n, power)} {random.choice(['equals', 'is'])} {n_to_power}.",
-        ]
-    return stmts
+def examples_from_natural_number_pair(pair: tuple[int, int]) -> list[str]:
+    return list(iter_examples_from_natural_number_pair(pair))
 
 
-def generate_corpus() -> set[str]:
-    docs = set()
-    for i in range(10):
-        docs.update(examples_from_natural_number(i))
-    for pair in generate_unique_number_pairs(121, 0, 10):
-        docs.update(examples_from_natural_number_pair(pair))
-    # General facts and maxims
-    docs.update([
+def examples_from_natural_number(n: int, rng: random.Random | None = None,
+                                 max_power: int = MAX_POWER, max_digits: int = MAX_POWER_DIGITS) -> list[str]:
+    return natural_number_examples(n, rng, max_power, max_digits) + number_theory_examples(n, rng)
+
+
+@instrumented("general_facts")
+def general_facts(rng: random.Random | None = None) -> list[str]:
+    """General facts and maxims that don't depend on any particular number."""
+    choice = random.choice if rng is None else rng.choice
+    return [
         "A positive number has a value greater than zero.",
         "A negative number has a value less than zero.",
 
@@ -423,29 +1118,62 @@ def generate_corpus() -> set[str]:
         "A space is Euclidean if it has zero intrinsic curvature.",
         f"In Euclidean space, a unique straight line can be drawn between any two distinct points, and this line can be extended indefinitely in either direction.",
         f"In Euclidean space, distances are calculated using the Pythagorean theorem, and they remain invariant under transformations like translations and rotations.",
-        f"In Euclidean space, sum of the interior angles of any triangle is always equal to 180{random.choice([' degrees', '°'])}.",
-        f"In Euclidean space, basic geometric transformations such as {random.choice(['shifting', 'translations'])} and {random.choice(['rotations', 'turning'])} are defined, and the space behaves according to these rules everywhere.",
+        f"In Euclidean space, sum of the interior angles of any triangle is always equal to 180{choice([' degrees', '°'])}.",
+        f"In Euclidean space, basic geometric transformations such as {choice(['shifting', 'translations'])} and {choice(['rotations', 'turning'])} are defined, and the space behaves according to these rules everywhere.",
         f"In Euclidean space, the Riemann curvature tensor is zero.",
-    ])
-    return docs
+    ]
 
 
-def generate_unique_number_pairs(num_pairs, lower_bound, upper_bound) -> set[tuple[int, int]]:
-    assert lower_bound < upper_bound, "Lower bound can't be greater than upper bound"
-    # Calculate the total possible unique pairs
-    range_size = upper_bound - lower_bound + 1
-    max_possible_pairs = range_size * range_size
-    assert num_pairs <= max_possible_pairs, (
-        f"Cannot generate {num_pairs} unique pairs. "
-        f"Only {max_possible_pairs} possible pairs exist in the range {lower_bound} to {upper_bound}."
-    )
-    unique_pairs = set()
-    while len(unique_pairs) < num_pairs:
-        x = random.randint(lower_bound, upper_bound)
-        y = random.randint(lower_bound, upper_bound)
-        # Adding to a set automatically handles the uniqueness check
-        unique_pairs.add((x, y))
-    return unique_pairs
+def generate_corpus() -> set[str]:
+    dedup = ExactDedup()
+    deque(iter_corpus(dedup=dedup), maxlen=0)
+    return dedup.seen
+
+
+def generate_unique_number_pairs(num_pairs, lower_bound, upper_bound,
+                                 rng: random.Random | None = None) -> set[tuple[int, int]]:
+    return set(iter_unique_number_pairs(num_pairs, lower_bound, upper_bound, rng=rng))
+
+
+def generate_work_unit(kind: str, items: tuple, seed: int, canonical: bool = False,
+                       tagged: bool = False) -> list[str] | list[tuple[str, DocumentTag]]:
+    """
+    Renders one work unit: a tuple of numbers, a tuple of pairs, or the general facts. With `tagged`, each document
+    comes with its DocumentTag, as from iter_tagged_documents.
+    """
+    if tagged:
+        if canonical:
+            raise ValueError("Tagged generation renders every template instance, so it can't be canonical")
+        match kind:
+            case "numbers":
+                return [item for n in items
+                        for item in _tagged_natural_number(n, _keyed_rng(seed, "natural_number", n))]
+            case "pairs":
+                return list(_iter_tagged_pairs(items, seed))
+            case "facts":
+                return _tagged_general_facts(CounterRandom(seed, "general_facts"))
+        raise ValueError(f"Unknown shard kind: {kind!r}")
+    match kind:
+        case "numbers":
+            return [doc for n in items for doc in get_documents(n, seed=seed)]
+        case "pairs":
+            return list(iter_examples_from_natural_number_pairs(items, seed, canonical=canonical))
+        case "facts":
+            return general_facts(CounterRandom(seed, "general_facts"))
+    raise ValueError(f"Unknown shard kind: {kind!r}")
+
+
+def get_documents(*operands: int, seed: int = 0) -> list[str]:
+    """
+    Regenerates the documents for one number, get_documents(n), or one ordered pair, get_documents(a, b), exactly as
+    iter_documents produces them for the same seed, without generating anything else.
+    """
+    match operands:
+        case (n,):
+            return examples_from_natural_number(n, _keyed_rng(seed, "natural_number", n))
+        case (a, b):
+            return list(iter_examples_from_natural_number_pair((a, b), seed))
+    raise TypeError(f"get_documents takes a number or a pair, got {len(operands)} operands")
 
 
 def is_denominator_of_terminating_decimal(simplified_denominator):
@@ -486,40 +1214,751 @@ def is_prime(number: int):
     return True
 
 
+def iter_corpus(numbers: Iterable[int] = range(10),
+                pairs: Iterable[tuple[int, int]] | None = None,
+                dedup: str | Dedup | DiskDedup | None = "exact",
+                seed: int | None = None,
+                canonical: bool = False) -> Iterator[str]:
+    """Yields deduplicated corpus documents as they are generated."""
+    seen = make_dedup(dedup)
+    docs = iter_documents(numbers, pairs, seed, canonical)
+    if isinstance(seen, DiskDedup):
+        yield from seen(docs)
+        return
+    if _stats is not None:
+        yield from _dedup_instrumented(docs, seen, _stats)
+        return
+    for doc in docs:
+        if seen is None or seen.add(doc):
+            yield doc
+
+
+def iter_corpus_parallel(numbers: Iterable[int] = range(10),
+                         pairs: Iterable[tuple[int, int]] | None = None,
+                         dedup: str | Dedup | DiskDedup | None = "exact",
+                         seed: int = 0,
+                         workers: int | None = None,
+                         shard_size: int = 64,
+                         canonical: bool = False) -> Iterator[str]:
+    """Like iter_corpus, but generated across a process pool, with identical output for a seed."""
+    seen = make_dedup(dedup)
+    batches = _map_shards(_corpus_shards(numbers, pairs, seed, shard_size), seed, workers or os.cpu_count() or 1, canonical)
+    if isinstance(seen, DiskDedup):
+        yield from seen(itertools.chain.from_iterable(batches))
+        return
+    if _stats is not None:
+        yield from _dedup_instrumented(itertools.chain.from_iterable(batches), seen, _stats)
+        return
+    for docs in batches:
+        for doc in docs:
+            if seen is None or seen.add(doc):
+                yield doc
+
+
+def iter_documents(numbers: Iterable[int] = range(10),
+                   pairs: Iterable[tuple[int, int]] | None = None,
+                   seed: int | None = None,
+                   canonical: bool = False) -> Iterator[str]:
+    """Yields every generated statement, duplicates included, in generate_corpus order."""
+    for n in numbers:
+        yield from examples_from_natural_number(n, _keyed_rng(seed, "natural_number", n))
+    if pairs is None:
+        pairs = iter_unique_number_pairs(121, 0, 10, rng=_keyed_rng(seed, "pairs"))
+    yield from iter_examples_from_natural_number_pairs(pairs, seed, canonical=canonical)
+    yield from general_facts(_keyed_rng(seed, "general_facts"))
+
+
+def iter_examples_from_natural_number_pair(pair: tuple[int, int], seed: int | None = None) -> Iterator[str]:
+    """Yields examples for a pair one statement family at a time instead of building the full list first."""
+    yield from iter_examples_from_pair_arithmetic(_pair_arithmetic_python([pair])[0], seed)
+
+
+def iter_examples_from_natural_number_pairs(pairs: Iterable[tuple[int, int]],
+                                            seed: int | None = None,
+                                            batch_size: int = 4096,
+                                            canonical: bool = False) -> Iterator[str]:
+    """
+    Yields examples for many pairs, one pair_arithmetic pass per batch. With `canonical`, see
+    iter_distinct_examples_from_pair_arithmetic; a pair whose swapped pair is in the same batch is rendered with it.
+    """
+    for batch in itertools.batched(pairs, batch_size):
+        batch_seed = random.getrandbits(64) if seed is None else seed
+        if not canonical:
+            for row in pair_arithmetic(batch):
+                yield from iter_examples_from_pair_arithmetic(row, batch_seed)
+            continue
+        in_batch = set(batch)
+        if batch := [(a, b) for a, b in batch if a <= b or (b, a) not in in_batch]:
+            for row in pair_arithmetic(batch):
+                both_orders = row.a != row.b and (row.b, row.a) in in_batch
+                yield from iter_distinct_examples_from_pair_arithmetic(row, batch_seed, both_orders)
+
+
+def iter_examples_from_pair_arithmetic(row: PairArithmetic, seed: int | None = None) -> Iterator[str]:
+    """
+    Renders every statement family for a pair from its precomputed arithmetic. With a seed, each family's variants
+    are keyed by (seed, family, operands), so the output for a pair never depends on what was generated before it.
+    """
+    for family, operands, values in _pair_instances(row):
+        yield from family.render(values, family.rnd_for(seed, *operands))
+
+
+def iter_distinct_examples_from_pair_arithmetic(row: PairArithmetic,
+                                                seed: int | None = None,
+                                                both_orders: bool = False) -> Iterator[str]:
+    """
+    Renders the instances iter_examples_from_pair_arithmetic renders for the pair, and with `both_orders` those of
+    its swapped pair too, skipping each template instance whose key was already rendered. Skipped instances would
+    only have been other phrasings of the same statement, so fewer distinct documents come out, and a skipped
+    template shifts the variant draws of the family's later ones, so some documents differ from the plain corpus.
+    """
+    a, b = row.a, row.b
+    # Sign variants of the pair; with a == b or a zero, some coincide and dict.fromkeys drops them.
+    operands = list(dict.fromkeys([(a, b), (-a, b), (a, -b), (-a, -b)]))
+    differences = operands + [(b, a)] if a != b else operands
+    if both_orders:
+        operands = differences = list(dict.fromkeys(operands + [(b, a), (-b, a), (b, -a), (-b, -a)]))
+    seen = set()
+    yield from A_PLUS_B.render_distinct(
+        [(_a_plus_b_values(x, y, x + y), A_PLUS_B.rnd_for(seed, x, y)) for x, y in operands], seen)
+    yield from A_MINUS_B.render_distinct(
+        [(_a_minus_b_values(x, y, x - y), A_MINUS_B.rnd_for(seed, x, y)) for x, y in differences], seen)
+    yield from A_TIMES_B.render_distinct(
+        [(_a_times_b_values(x, y, x * y, row.ab_lcm), A_TIMES_B.rnd_for(seed, x, y)) for x, y in operands], seen)
+    division = []
+    if b != 0:
+        division.append((_a_divided_by_b_values(
+            a, b, row.ab_quotient, row.ab_remainder, row.ab_float, row.ab_gcd, row.ab_rb_gcd, row.ab_terminating),
+            A_DIVIDED_BY_B.rnd_for(seed, a, b)))
+    if a != 0 and a != b:
+        division.append((_a_divided_by_b_values(
+            b, a, row.ba_quotient, row.ba_remainder, row.ba_float, row.ab_gcd, row.ba_rb_gcd, row.ba_terminating),
+            A_DIVIDED_BY_B.rnd_for(seed, b, a)))
+    yield from A_DIVIDED_BY_B.render_distinct(division, seen)
+
+
+def iter_indexed_corpus(index: CorpusIndex,
+                        numbers: Iterable[int] = range(10),
+                        pairs: Iterable[tuple[int, int]] | None = None,
+                        seed: int = 0,
+                        workers: int | None = None,
+                        shard_size: int = 64) -> Iterator[str]:
+    """Like iter_corpus_parallel, but adds every document to `index`, which is also the dedup stage."""
+    for doc, _ in iter_tagged_corpus(numbers, pairs, index, seed, workers, shard_size):
+        yield doc
+
+
+def iter_tagged_corpus(numbers: Iterable[int] = range(10),
+                       pairs: Iterable[tuple[int, int]] | None = None,
+                       dedup: str | Dedup | CorpusIndex | None = "exact",
+                       seed: int = 0,
+                       workers: int | None = None,
+                       shard_size: int = 64) -> Iterator[tuple[str, DocumentTag]]:
+    """
+    Like iter_corpus_parallel, but yields each document with its DocumentTag. `dedup` can also be a CorpusIndex,
+    which is given every document generated, duplicates included.
+    """
+    seen = make_dedup(dedup, streaming=True)
+    shards = _corpus_shards(numbers, pairs, seed, shard_size)
+    index = seen if isinstance(seen, CorpusIndex) else None
+    for tagged in _map_shards(shards, seed, workers or os.cpu_count() or 1, tagged=True):
+        for doc, tag in tagged:
+            if seen is None or (seen.add(doc) if index is None else index.add(doc, tag)):
+                yield doc, tag
+
+
+def iter_tagged_documents(numbers: Iterable[int] = range(10),
+                          pairs: Iterable[tuple[int, int]] | None = None,
+                          seed: int | None = None) -> Iterator[tuple[str, DocumentTag]]:
+    """
+    Yields every statement iter_documents yields for the same seed, in the same order and with the same text, each
+    with the DocumentTag of the template instance that rendered it.
+    """
+    for n in numbers:
+        yield from _tagged_natural_number(n, _keyed_rng(seed, "natural_number", n))
+    if pairs is None:
+        pairs = iter_unique_number_pairs(121, 0, 10, rng=_keyed_rng(seed, "pairs"))
+    yield from _iter_tagged_pairs(pairs, seed)
+    yield from _tagged_general_facts(_keyed_rng(seed, "general_facts"))
+
+
+def iter_unique_number_pairs(num_pairs: int | None, lower_bound: int, upper_bound: int,
+                             rng: random.Random | None = None,
+                             shuffle: bool = True) -> Iterator[tuple[int, int]]:
+    """Lazily yields `num_pairs` distinct pairs from [lower_bound, upper_bound]², or all of them."""
+    assert lower_bound < upper_bound, "Lower bound can't be greater than upper bound"
+    # Calculate the total possible unique pairs
+    range_size = upper_bound - lower_bound + 1
+    max_possible_pairs = range_size * range_size
+    if num_pairs is None:
+        num_pairs = max_possible_pairs
+    assert num_pairs <= max_possible_pairs, (
+        f"Cannot generate {num_pairs} unique pairs. "
+        f"Only {max_possible_pairs} possible pairs exist in the range {lower_bound} to {upper_bound}."
+    )
+    if shuffle:
+        key = (random.getrandbits if rng is None else rng.getrandbits)(64)
+        indices = map(KeyedPermutation(max_possible_pairs, key), range(num_pairs))
+    else:
+        indices = range(num_pairs)
+    for i in indices:
+        x, y = divmod(i, range_size)
+        yield lower_bound + x, lower_bound + y
+
+
+def iter_work_units(upper: int | None = None, shard_size: int = 64) -> Iterator[tuple[str, tuple]]:
+    """Yields the (kind, items) work units for range(upper), small operands first."""
+    yield "facts", ()
+    for start in itertools.count(0, shard_size):
+        stop = start + shard_size if upper is None else min(start + shard_size, upper)
+        if start >= stop:
+            return
+        yield "numbers", tuple(range(start, stop))
+        for m in range(start, stop):
+            for offset in range(0, 2 * m + 1, shard_size):
+                yield "pairs", tuple(_pair_shell(m, offset, min(offset + shard_size, 2 * m + 1)))
+
+
+def make_dedup(dedup: str | Dedup | DiskDedup | CorpusIndex | None,
+               streaming: bool = False) -> Dedup | DiskDedup | CorpusIndex | None:
+    """
+    Resolves the `dedup` argument accepted by the corpus iterators into a dedup stage, or None when it's off. With
+    `streaming`, the caller handles documents as they're generated, so disk dedup is rejected.
+    """
+    if streaming and (dedup == "disk" or isinstance(dedup, DiskDedup)):
+        raise ValueError("Disk dedup only yields documents once all of them have been generated, so it can't be "
+                         "used here; use a streaming dedup stage such as exact, fingerprint or compact")
+    match dedup:
+        case None | "off":
+            return None
+        case "exact":
+            return ExactDedup()
+        case "fingerprint":
+            return FingerprintDedup()
+        case "compact":
+            return CompactCorpus()
+        case "disk":
+            return DiskDedup()
+        case str():
+            raise ValueError(f"Unknown dedup mode: {dedup!r}")
+    return dedup
+
+
+def pair_arithmetic(pairs: Sequence[tuple[int, int]]) -> list[PairArithmetic]:
+    """Computes every derived quantity the pair templates need for a batch of pairs."""
+    if np is None or not pairs or max(max(abs(a), abs(b)) for a, b in pairs) >= 1 << 31:
+        return _pair_arithmetic_python(pairs)
+    ab = np.array(pairs, dtype=np.int64)
+    a, b = ab[:, 0], ab[:, 1]
+    safe_a = np.where(a == 0, 1, a)
+    safe_b = np.where(b == 0, 1, b)
+    ab_gcd = np.gcd(a, b)
+    # Division by zero is never rendered; zero those slots so both code paths agree.
+    ab_quotient, ab_remainder = (np.where(b == 0, 0, column) for column in np.divmod(a, safe_b))
+    ba_quotient, ba_remainder = (np.where(a == 0, 0, column) for column in np.divmod(b, safe_a))
+    ab_rb_gcd = np.gcd(ab_remainder, safe_b)
+    ba_rb_gcd = np.gcd(ba_remainder, safe_a)
+    columns = [
+        a, b, a + b, a - b, a * b, ab_gcd, np.lcm(a, b),
+        ab_quotient, ab_remainder, ab_rb_gcd, _terminating_denominators(safe_b // ab_rb_gcd), np.where(b == 0, 0.0, a / safe_b),
+        ba_quotient, ba_remainder, ba_rb_gcd, _terminating_denominators(safe_a // ba_rb_gcd), np.where(a == 0, 0.0, b / safe_a),
+    ]
+    return list(map(PairArithmetic._make, zip(*(column.tolist() for column in columns))))
+
+
+@instrumented("natural_number")
+def natural_number_examples(n: int, rng: random.Random | None = None,
+                            max_power: int = MAX_POWER, max_digits: int = MAX_POWER_DIGITS) -> list[str]:
+    choice = random.choice if rng is None else rng.choice
+    stmts = [
+        f"{n} = {n}",
+        f"{n} equals {n}.",
+    ]
+    try:
+        word = RENDERER.word(n)
+        stmts += [
+            f"{n} is numerically equivalent to {word}.",
+            f"{word.capitalize()} is numerically equivalent to {n}.",
+        ]
+    except OverflowError:  # Too large for num2words to spell out
+        pass
+    is_zero = n == 0
+    if not is_zero:
+        small = n.bit_length() < 1000  # Small enough for the float statements
+        if small:
+            stmts.append(f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a circle with a radius of {n} has a circumference {choice(['approximately', 'roughly'])} equal to {2 * n * math.pi}.")
+        stmts += [
+            f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a circle with a radius of {n} has a circumference {choice(['of', 'equal to'])} {2 * n} {random_multiplication_sign(rng=rng)} π.",
+            f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a circle with a radius of {n} has a diameter {choice(['of', 'equal to'])} {2 * n}.",
+            f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a circle with a radius of {n} has an area {choice(['of', 'equal to'])} {random_exponent_expr(n, 2, rng=rng)} {random_multiplication_sign(rng=rng)} π.",
+            f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a square with an area {choice(['of', 'equal to'])} {random_exponent_expr(n, 2, rng=rng)} has an edge length of {n}.",
+            f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a square with an edge length of {n} has an area {choice(['of', 'equal to'])} {random_exponent_expr(n, 2, rng=rng)}.",
+            f"{n} {random_multiplication_sign(rng=rng)} 1/{n} = 1",
+        ]
+        if small:
+            stmts.append(f"{n} {random_multiplication_sign(rng=rng)} {1 / n} ≈ 1")
+        stmts += [
+            f"{n} {random_multiplication_sign(rng=rng)} {to_superscript(1)}⁄{to_subscript(n)} = 1",
+            f"|{-n}| = {n}",
+            f"|{n}| = {n}",
+        ]
+        if number_theory_table(n).is_prime(n):
+            stmts.append(f"1 and {n} are the only divisors of {n}.")
+            stmts.append(f"{n} is a prime number.")
+    powers = PowerTable(n, max_power, max_digits)
+    for power in range(1 if is_zero else 0, max_power + 1):
+        n_to_power = powers.strings[power]
+        if not powers.exact[power]:
+            stmts += [
+                f"{random_exponent_expr(n, power, rng=rng)} ≈ {n_to_power}",
+                f"{n} to the power of {power} is {choice(['approximately', 'roughly'])} {n_to_power}.",
+            ]
+            continue
+        value = powers.values[power]
+        match power:
+            case 2:
+                if not is_zero:
+                    fits_float = powers.fits_float(power)
+                    if fits_float:
+                        stmts.append(f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a circle with a radius of {n} has an area {choice(['approximately', 'roughly'])} equal to {value * math.pi}.")
+                    stmts += [
+                        f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a circle with a radius of {n} has an area {choice(['of', 'equal to'])} {n_to_power}π.",
+                        f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a square with a side length of {n} has an area {choice(['of', 'equal to'])} {n_to_power}.",
+                        f"{random_euclidean_qualifier(capitalize=True, rng=rng)}, a square with an area {choice(['of', 'equal to'])} {n_to_power} has a side length of {n}.",
+                    ]
+                    if fits_float:
+                        stmts.append(f"{random_euclidean_qualifier(d=3, capitalize=True, rng=rng)}, a sphere with a radius of {n} has a surface area {choice(['approximately', 'roughly'])} equal to {4 * value * math.pi}.")
+                    stmts.append(f"{random_euclidean_qualifier(d=3, capitalize=True, rng=rng)}, a sphere with a radius of {n} has a surface area {choice(['of', 'equal to'])} {4 * value}π.")
+                stmts += [
+                    f"The principal square root of {n_to_power} {choice(['equals', 'is'])} {n}.",
+                    f"{n} is the principal square root of {n_to_power}.",
+                    f"{n} raised to the 2nd power {choice(['equals', 'is'])} {n_to_power}.",
+                    f"{n} squared is {n_to_power}.",
+                ]
+            case 3:
+                if not is_zero:
+                    stmts += [
+                        f"{random_euclidean_qualifier(d=3, capitalize=True, rng=rng)}, a cube with an edge length of {n} has a volume {choice(['of', 'equal to'])} {n_to_power}.",
+                        f"{random_euclidean_qualifier(d=3, capitalize=True, rng=rng)}, a cube with an edge length of {n} has {choice(['6', 'six'])} faces, each with an area {choice(['of', 'equal to'])} {powers.strings[2]}.",
+                    ]
+                    if powers.fits_float(power):
+                        stmts += [
+                            f"{random_euclidean_qualifier(d=3, capitalize=True, rng=rng)}, a sphere with a radius of {n} has a volume {choice(['approximately', 'roughly'])} equal to {(4/3) * value * math.pi}.",
+                            f"{random_euclidean_qualifier(d=3, capitalize=True, rng=rng)}, a sphere with a radius of {n} has a volume {choice(['of', 'equal to'])} {(4/3) * value}π.",
+                        ]
+                stmts += [
+                    f"The cube root of {n_to_power} {choice(['equals', 'is'])} {n}.",
+                    f"{n} cubed {choice(['equals', 'is'])} {n_to_power}.",
+                    f"{n} is the cube root of {n_to_power}.",
+                    f"{n} raised to the 3rd power {choice(['equals', 'is'])} {n_to_power}.",
+                ]
+        if power > 1:
+            power_ordinal = RENDERER.ordinal(power)
+            stmts += [
+                f"The {power_ordinal} root of {n_to_power} {choice(['equals', 'is'])} {n}.",
+                f"{n} is the {power_ordinal} root of {n_to_power}.",
+                f"{n} raised to the {power_ordinal} power {choice(['equals', 'is'])} {n_to_power}.",
+                f"{n} to the power of {power} {choice(['equals', 'is'])} {n_to_power}.",
+            ]
+            if power > 3:
+                stmts.append(f"{n} raised to the {power}th power {choice(['equals', 'is'])} {n_to_power}.")
+        stmts += [
+            f"{random_exponent_expr(n, power, rng=rng)} = {n_to_power}",
+            f"{random_exponent_expr(n, power, rng=rng)} {choice(['equals', 'is'])} {n_to_power}.",
+        ]
+    return stmts
+
+
+def number_theory_examples(n: int, rng: random.Random | None = None) -> list[str]:
+    """Generates prime factorization, divisor and totient facts about n, for 0 < n <= MAX_SIEVE_LIMIT."""
+    if not 0 < n <= MAX_SIEVE_LIMIT:
+        return []
+    return NUMBER_THEORY.render(_number_theory_values(n), random.random if rng is None else rng.random)
+
+
+def number_theory_table(limit: int) -> NumberTheoryTable:
+    """Returns the shared sieve, rebuilt with headroom when it doesn't cover `limit`."""
+    global _number_theory
+    if limit > MAX_SIEVE_LIMIT:
+        limit = 0  # Past the cap the table's fallbacks answer anyway, so don't grow it.
+    if _number_theory is None:
+        _number_theory = NumberTheoryTable(max(limit, 1 << 16))
+    elif _number_theory.limit < limit:
+        _number_theory = NumberTheoryTable(min(max(limit, 2 * _number_theory.limit), MAX_SIEVE_LIMIT))
+    return _number_theory
+
+
 def parenthesize_if_negative(a: int, b: int) -> tuple[str, str]:
-    return f"({a})" if a < 0 else str(a), f"({b})" if b < 0 else str(b)
+    return RENDERER.parenthesized(a), RENDERER.parenthesized(b)
 
 
-def random_division_sign(exclude: set[str] = None):
-    default = ["/", "⁄", "÷"]
-    return random.choice(default if exclude is None else [s for s in default if s not in exclude])
+def random_division_sign(exclude: set[str] = None, rng: random.Random | None = None):
+    choice = random.choice if rng is None else rng.choice
+    return choice(DIVISION_SIGNS if exclude is None else [s for s in DIVISION_SIGNS if s not in exclude])
 
 
-def random_euclidean_qualifier(d: int = 2, capitalize: bool = False) -> str:
-    choice = random.choice(["in Euclidean space", f"in {d}-dimensional Euclidean space"])
+def random_euclidean_qualifier(d: int = 2, capitalize: bool = False, rng: random.Random | None = None) -> str:
+    qualifiers = ["in Euclidean space", f"in {d}-dimensional Euclidean space"]
+    choice = random.choice(qualifiers) if rng is None else rng.choice(qualifiers)
     if capitalize:
         choice = choice[0].upper() + choice[1:]
     return choice
 
 
-def random_exponent_expr(n, power):
-    return f"{n}{random.choice([f'^{power}', f'**{power}', to_superscript(power)])}"
+def random_exponent_expr(n, power, rng: random.Random | None = None):
+    choice = random.choice if rng is None else rng.choice
+    return f"{n}{choice([f'^{power}', f'**{power}', to_superscript(power)])}"
 
 
-def random_multiplication_sign(exclude: set[str] = None):
-    default = ["*", "×", "x", "·"]
-    return random.choice(default if exclude is None else [s for s in default if s not in exclude])
+def random_multiplication_sign(exclude: set[str] = None, rng: random.Random | None = None):
+    choice = random.choice if rng is None else rng.choice
+    return choice(MULTIPLICATION_SIGNS if exclude is None else [s for s in MULTIPLICATION_SIGNS if s not in exclude])
 
 
 def to_subscript(val):
+    if isinstance(val, int):
+        return RENDERER.subscript(val)
     return "".join(SUBSCRIPT_MAP.get(char, char) for char in str(val))
 
 
 def to_superscript(val):
+    if isinstance(val, int):
+        return RENDERER.superscript(val)
     return "".join(SUPERSCRIPT_MAP.get(char, char) for char in str(val))
 
 
+def _mix64(x: int) -> int:
+    """The splitmix64 finalizer: a cheap, well-distributed 64-bit integer hash."""
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def _miller_rabin(n: int) -> bool:
+    """Deterministic Miller-Rabin primality test: exact for n < 3.3 * 10²⁴, and a strong probable-prime test past it."""
+    if n < 2:
+        return False
+    for p in _MILLER_RABIN_BASES:
+        if n % p == 0:
+            return n == p
+    d = (n - 1) >> ((n - 1) & -(n - 1)).bit_length() - 1
+    for base in _MILLER_RABIN_BASES:
+        x = pow(base, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(((n - 1) // d).bit_length() - 2):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _num2words(n: int, to: str = "cardinal") -> str:
+    from num2words import num2words  # Deferred so warm starts with a precomputed table skip the import.
+    return num2words(n, to=to)
+
+
+def _pair_arithmetic_python(pairs: Iterable[tuple[int, int]]) -> list[PairArithmetic]:
+    rows = []
+    for a, b in pairs:
+        ab_gcd = math.gcd(a, b)
+        ab_quotient, ab_remainder = divmod(a, b) if b != 0 else (0, 0)
+        ba_quotient, ba_remainder = divmod(b, a) if a != 0 else (0, 0)
+        ab_rb_gcd = math.gcd(ab_remainder, b or 1)
+        ba_rb_gcd = math.gcd(ba_remainder, a or 1)
+        rows.append(PairArithmetic(
+            a, b, a + b, a - b, a * b, ab_gcd, math.lcm(a, b),
+            ab_quotient, ab_remainder, ab_rb_gcd, is_denominator_of_terminating_decimal((b or 1) // ab_rb_gcd),
+            a / b if b != 0 else 0.0,
+            ba_quotient, ba_remainder, ba_rb_gcd, is_denominator_of_terminating_decimal((a or 1) // ba_rb_gcd),
+            b / a if a != 0 else 0.0,
+        ))
+    return rows
+
+
+def _pair_instances(row: PairArithmetic) -> Iterator[tuple[TemplateFamily, tuple[int, int], dict]]:
+    """The (family, operands, values) instances iter_examples_from_pair_arithmetic renders for a pair, in order."""
+    a, b = row.a, row.b
+
+    # Addition
+    yield A_PLUS_B, (a, b), _a_plus_b_values(a, b, row.ab_sum)
+    yield A_PLUS_B, (-a, b), _a_plus_b_values(-a, b, -row.ab_difference)
+    yield A_PLUS_B, (a, -b), _a_plus_b_values(a, -b, row.ab_difference)
+    yield A_PLUS_B, (-a, -b), _a_plus_b_values(-a, -b, -row.ab_sum)
+
+    # Subtraction
+    yield A_MINUS_B, (a, b), _a_minus_b_values(a, b, row.ab_difference)
+    yield A_MINUS_B, (-a, b), _a_minus_b_values(-a, b, -row.ab_sum)
+    yield A_MINUS_B, (a, -b), _a_minus_b_values(a, -b, row.ab_sum)
+    yield A_MINUS_B, (-a, -b), _a_minus_b_values(-a, -b, -row.ab_difference)
+
+    # Multiplication
+    yield A_TIMES_B, (a, b), _a_times_b_values(a, b, row.ab_product, row.ab_lcm)
+    yield A_TIMES_B, (-a, b), _a_times_b_values(-a, b, -row.ab_product, row.ab_lcm)
+    yield A_TIMES_B, (a, -b), _a_times_b_values(a, -b, -row.ab_product, row.ab_lcm)
+    yield A_TIMES_B, (-a, -b), _a_times_b_values(-a, -b, row.ab_product, row.ab_lcm)
+
+    if a != b:
+        yield A_MINUS_B, (b, a), _a_minus_b_values(b, a, -row.ab_difference)
+
+    # Division
+    if b != 0:
+        yield A_DIVIDED_BY_B, (a, b), _a_divided_by_b_values(
+            a, b, row.ab_quotient, row.ab_remainder, row.ab_float, row.ab_gcd, row.ab_rb_gcd, row.ab_terminating)
+    if a != 0:
+        yield A_DIVIDED_BY_B, (b, a), _a_divided_by_b_values(
+            b, a, row.ba_quotient, row.ba_remainder, row.ba_float, row.ab_gcd, row.ba_rb_gcd, row.ba_terminating)
+
+    # TODO: Euclidean geometry and more advanced math
+    #   - Triangles: area, hypotenuse, etc.
+
+
+def _pair_shell(m: int, start: int, stop: int) -> Iterator[tuple[int, int]]:
+    """Pairs start..stop-1 of the 2m + 1 pairs whose larger operand is m: (0, m) .. (m, m), then (m, 0) .. (m, m-1)."""
+    for i in range(start, stop):
+        yield (i, m) if i <= m else (m, i - m - 1)
+
+
+def _render_pair_family(family: str, seed: int, pair: tuple[int, int]) -> list[str]:
+    a, b = pair
+    match family:
+        case "a_plus_b":
+            return A_PLUS_B.render(_a_plus_b_values(a, b, a + b), A_PLUS_B.rnd_for(seed, a, b))
+        case "a_minus_b":
+            return A_MINUS_B.render(_a_minus_b_values(a, b, a - b), A_MINUS_B.rnd_for(seed, a, b))
+        case "a_times_b":
+            return A_TIMES_B.render(_a_times_b_values(a, b, a * b), A_TIMES_B.rnd_for(seed, a, b))
+        case "a_divided_by_b":
+            if b == 0:
+                return []
+            row = _pair_arithmetic_python([pair])[0]
+            return A_DIVIDED_BY_B.render(_a_divided_by_b_values(
+                a, b, row.ab_quotient, row.ab_remainder, row.ab_float, row.ab_gcd, row.ab_rb_gcd, row.ab_terminating),
+                A_DIVIDED_BY_B.rnd_for(seed, a, b))
+    raise ValueError(f"Unknown pair family: {family!r}")
+
+
+def _scientific(log10_magnitude: float, negative: bool = False) -> str:
+    """Formats 10^log10_magnitude like Python formats large floats, e.g. 1.234567891e+1500."""
+    exponent = math.floor(log10_magnitude)
+    mantissa = 10 ** (log10_magnitude - exponent)
+    return f"{'-' if negative else ''}{mantissa:.10g}e+{exponent}"
+
+
+def _terminating_denominators(denominators):
+    """Vectorized is_denominator_of_terminating_decimal for an array of positive denominators."""
+    denominators = denominators // (denominators & -denominators)  # Strip every factor of 2 at once
+    while (divisible := denominators % 5 == 0).any():
+        denominators = np.where(divisible, denominators // 5, denominators)
+    return denominators == 1
+
+
+def _corpus_shards(numbers: Iterable[int], pairs: Iterable[tuple[int, int]] | None, seed: int,
+                   shard_size: int) -> Iterator[tuple[str, tuple]]:
+    """The (kind, items) shards of the numbers, then the pairs (121 drawn from [0, 10]² by default), then the facts."""
+    if pairs is None:
+        pairs = iter_unique_number_pairs(121, 0, 10, rng=CounterRandom(seed, "pairs"))
+    return itertools.chain(
+        (("numbers", shard) for shard in itertools.batched(numbers, shard_size)),
+        (("pairs", shard) for shard in itertools.batched(pairs, shard_size)),
+        [("facts", ())],
+    )
+
+
+def _counter_stream(state: int) -> Callable[[], float]:
+    """The same draws as CounterRandom.random for a stream starting at `state`, as a cheaper closure."""
+    def rnd() -> float:
+        nonlocal state
+        state = (state + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        x = ((state ^ (state >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        return ((x ^ (x >> 31)) >> 11) * (1.0 / (1 << 53))
+    return rnd
+
+
+def _dedup_instrumented(docs: Iterable[str], seen: Dedup | None, stats: GenerationStats) -> Iterator[str]:
+    """The dedup loop of the corpus iterators, charging each discarded duplicate to the template that produced it."""
+    stats.track_sources = True
+    try:
+        for doc in docs:
+            if seen is None or seen.add(doc):
+                stats.record_dedup(doc, duplicate=False)
+                yield doc
+            else:
+                stats.record_dedup(doc, duplicate=True)
+    finally:
+        stats.track_sources = False
+
+
+def _hash_key(*key) -> int:
+    """A stable 64-bit hash of a key of ints and strings. Ints are folded modulo 2⁶⁴."""
+    h = 0
+    for part in key:
+        h = _mix64(h ^ ((part & 0xFFFFFFFFFFFFFFFF) if isinstance(part, int) else _hash_str(part)))
+    return h
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_str(part: str) -> int:
+    return int.from_bytes(hashlib.blake2b(part.encode(), digest_size=8).digest(), "little")
+
+
+def _iter_tagged_pairs(pairs: Iterable[tuple[int, int]], seed: int | None,
+                       batch_size: int = 4096) -> Iterator[tuple[str, DocumentTag]]:
+    """The tagged counterpart of iter_examples_from_natural_number_pairs."""
+    for batch in itertools.batched(pairs, batch_size):
+        batch_seed = random.getrandbits(64) if seed is None else seed
+        for row in pair_arithmetic(batch):
+            for family, operands, values in _pair_instances(row):
+                yield from family.render_tagged(values, family.rnd_for(batch_seed, *operands), operands)
+
+
+def _keyed_rng(seed: int | None, *key) -> random.Random | None:
+    return None if seed is None else CounterRandom(seed, *key)
+
+
+def _map_shards(shards: Iterable[tuple[str, tuple]], seed: int, workers: int,
+                canonical: bool = False, tagged: bool = False) -> Iterator[list]:
+    """Generates shards in order, keeping at most two shards per worker in flight."""
+    if workers <= 1:
+        for shard in shards:
+            yield generate_work_unit(*shard, seed, canonical, tagged)
+        return
+    executor = ProcessPoolExecutor(workers)
+    pending = deque()
+    try:
+        for shard in shards:
+            pending.append(executor.submit(generate_work_unit, *shard, seed, canonical, tagged))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _tagged_general_facts(rng: random.Random | None) -> list[tuple[str, DocumentTag]]:
+    tag = DocumentTag("general_facts", "general_facts", (), {})
+    return [(doc, tag) for doc in general_facts(rng)]
+
+
+def _tagged_natural_number(n: int, rng: random.Random | None) -> list[tuple[str, DocumentTag]]:
+    """The tagged counterpart of examples_from_natural_number."""
+    tag = DocumentTag("natural_number", "natural_number", (n,), {"n": n})
+    tagged = [(doc, tag) for doc in natural_number_examples(n, rng)]
+    if 0 < n <= MAX_SIEVE_LIMIT:
+        tagged += NUMBER_THEORY.render_tagged(_number_theory_values(n), random.random if rng is None else rng.random,
+                                              (n,))
+    return tagged
+
+
 if __name__ == "__main__":
-    corpus = generate_corpus()
-    print(corpus)
-    print(f"corpus length: {len(corpus)}")
+    import argparse
+
+    from corpus_writer import check_options, write_corpus
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out-dir", default="corpus")
+    parser.add_argument("--format", choices=["jsonl", "parquet", "tokens"], default="jsonl",
+                        help="tokens writes uncompressed, memory-mappable token ids (needs --tokenizer)")
+    parser.add_argument("--compression", choices=["zstd", "gzip", "none"], default="gzip",
+                        help="zstd needs the zstandard package, and parquet output needs pyarrow")
+    parser.add_argument("--tokenizer", help="tiktoken BPE file, or a pickled tiktoken Encoding, for --format tokens")
+    parser.add_argument("--docs-per-shard", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=None, help="generation processes (default: all cores)")
+    parser.add_argument("--writer-threads", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stats", help="write per-family and per-template stats to this JSON file (generates "
+                                        "in-process)")
+    parser.add_argument("--profile", help="write cProfile stats to this file (generates in-process)")
+    parser.add_argument("--dedup", choices=["exact", "fingerprint", "compact", "disk", "off"], default="exact")
+    parser.add_argument("--memory-budget", type=int, default=1 << 30,
+                        help="bytes --dedup disk may use for partitioning and per-bucket dedup, or --dedup "
+                             "fingerprint for its table")
+    parser.add_argument("--dedup-dir", help="where --dedup disk puts its bucket files (default: system temp dir)")
+    parser.add_argument("--upper", type=int, help="incrementally build numbers 0..UPPER-1 and every pair of them "
+                                                  "into --out-dir, generating only what isn't there yet")
+    parser.add_argument("--canonical", action="store_true",
+                        help="render each pair's statements once for both orders and all signs, skipping most "
+                             "statements that would only be discarded as duplicates; this also drops their other "
+                             "phrasings, so the corpus has fewer distinct documents")
+    parser.add_argument("--index", help="index documents by family, template and operands while generating, and save "
+                                        "the CorpusIndex to this file (dedups exactly unless --dedup off)")
+    parser.add_argument("--verify", help="check equation-style statements while generating, and write the "
+                                         "VerificationReport, failures per template, to this JSON file")
+    parser.add_argument("--mix", help="sample a mixture instead, e.g. a_times_b=3,a_divided_by_b=2,natural_number=1")
+    parser.add_argument("--budget", type=int, default=1 << 30, help="UTF-8 bytes to sample with --mix")
+    parser.add_argument("--mix-upper", type=int, default=1000, help="largest operand --mix draws")
+    args = parser.parse_args()
+    compression = None if args.compression == "none" or args.format == "tokens" else args.compression
+    tagged = args.index is not None or args.verify is not None
+    if tagged and (args.upper is not None or args.mix is not None or args.canonical or args.stats or args.profile):
+        parser.error("--index and --verify can't be combined with --upper, --mix, --canonical, --stats or --profile")
+    if args.format == "tokens" and args.tokenizer is None:
+        parser.error("--format tokens needs --tokenizer")
+    if args.dedup == "disk" and (args.upper is not None or args.mix is not None or tagged):
+        parser.error("--dedup disk only yields documents once all of them have been generated, so it can't be "
+                     "combined with --upper, --mix, --index or --verify")
+    try:
+        check_options(args.format, compression, args.tokenizer)
+    except (ValueError, ModuleNotFoundError) as e:
+        parser.error(str(e))
+    if args.dedup == "disk":
+        dedup = DiskDedup(args.dedup_dir, args.memory_budget, workers=args.workers)
+    elif args.dedup == "fingerprint":
+        dedup = FingerprintDedup(memory_budget=args.memory_budget)
+    else:
+        dedup = make_dedup(args.dedup)
+
+    if args.upper is not None:
+        manifest = build_corpus(args.out_dir, args.upper, seed=args.seed, dedup=dedup, workers=args.workers,
+                                writer_threads=args.writer_threads, docs_per_shard=args.docs_per_shard,
+                                fmt=args.format, compression=compression, tokenizer=args.tokenizer)
+        print(f"corpus length: {manifest['num_docs']} in {len(manifest['shards'])} shard(s) under {args.out_dir}")
+        raise SystemExit
+
+    instrument = args.stats is not None or args.profile is not None
+    with collect_stats(args.profile) if instrument else contextlib.nullcontext() as stats:
+        if args.mix is not None:
+            weights = {family: float(weight) for family, weight in (part.split("=") for part in args.mix.split(","))}
+            docs = MixtureSampler(weights, args.budget, seed=args.seed, upper=args.mix_upper, dedup=dedup)
+        elif tagged:
+            from verify_statements import StatementVerifier
+
+            if args.index is not None:
+                index = dedup = CorpusIndex(dedup=dedup is not None)
+            tagged_docs = iter_tagged_corpus(dedup=dedup, seed=args.seed, workers=args.workers)
+            if args.verify is not None:
+                verifier = StatementVerifier(workers=args.workers)
+                tagged_docs = verifier(tagged_docs)
+            docs = (doc for doc, _ in tagged_docs)
+        else:
+            docs = iter_corpus_parallel(dedup=dedup, seed=args.seed, workers=1 if instrument else args.workers,
+                                        canonical=args.canonical)
+        manifest = write_corpus(
+            docs,
+            args.out_dir,
+            docs_per_shard=args.docs_per_shard,
+            fmt=args.format,
+            compression=compression,
+            workers=args.writer_threads,
+            manifest_extra={"seed": args.seed},
+            tokenizer=args.tokenizer,
+        )
+    if args.index is not None:
+        index.save(args.index)
+    if args.verify is not None:
+        verifier.report.dump(args.verify)
+        print(verifier.report.summary())
+    if args.stats is not None:
+        stats.dump(args.stats)
+        print(stats.summary())
+    print(f"corpus length: {manifest['num_docs']} in {len(manifest['shards'])} shard(s) under {args.out_dir}")
+    if dedup is not None:
+        generated = manifest["num_docs"] + dedup.num_duplicates
+        print(f"duplicates discarded: {dedup.num_duplicates} ({dedup.num_duplicates / max(generated, 1):.1%} of "
+              f"generated)")
+        if isinstance(dedup, FingerprintDedup):
+            print(f"documents past the fingerprint table's capacity, not deduplicated: {dedup.num_overflowed}")
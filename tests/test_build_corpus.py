@@ -0,0 +1,46 @@
+import base64
+
+import pytest
+
+import math_curriculum as mc
+from corpus_writer import read_manifest, read_shard
+
+
+def all_docs(out_dir, tokenizer=None):
+    return [doc for shard in read_manifest(out_dir)["shards"]
+            for doc in read_shard(str(out_dir / shard["file"]), tokenizer)]
+
+
+@pytest.fixture
+def byte_vocab(tmp_path):
+    # A byte-level vocab with no merges: every document round-trips, one token per byte.
+    path = tmp_path / "bytes.tiktoken"
+    path.write_text("".join(f"{base64.b64encode(bytes([i])).decode()} {i}\n" for i in range(256)))
+    return str(path)
+
+
+def test_grow_jsonl_corpus(tmp_path):
+    mc.build_corpus(str(tmp_path / "grown"), 4, workers=1)
+    mc.build_corpus(str(tmp_path / "grown"), 6, workers=1)
+    mc.build_corpus(str(tmp_path / "whole"), 6, workers=1)
+    grown = all_docs(tmp_path / "grown")
+    assert len(grown) == len(set(grown))
+    assert sorted(grown) == sorted(all_docs(tmp_path / "whole"))
+
+
+def test_grow_token_corpus(tmp_path, byte_vocab):
+    pytest.importorskip("tiktoken")
+    options = {"fmt": "tokens", "compression": None, "tokenizer": byte_vocab, "workers": 1}
+    mc.build_corpus(str(tmp_path / "grown"), 4, **options)
+    mc.build_corpus(str(tmp_path / "grown"), 6, **options)
+    mc.build_corpus(str(tmp_path / "whole"), 6, **options)
+    grown = all_docs(tmp_path / "grown", byte_vocab)
+    assert len(grown) == len(set(grown))
+    assert sorted(grown) == sorted(all_docs(tmp_path / "whole", byte_vocab))
+
+
+def test_token_shard_needs_tokenizer(tmp_path, byte_vocab):
+    pytest.importorskip("tiktoken")
+    mc.build_corpus(str(tmp_path), 3, fmt="tokens", compression=None, tokenizer=byte_vocab, workers=1)
+    with pytest.raises(ValueError, match="tokenizer"):
+        read_shard(str(tmp_path / read_manifest(tmp_path)["shards"][0]["file"]))
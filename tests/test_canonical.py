@@ -0,0 +1,28 @@
+import math_curriculum as mc
+
+
+def corpus(pairs, canonical):
+    return set(mc.iter_corpus(range(0), pairs, seed=3, canonical=canonical))
+
+
+def test_canonical_renders_only_the_pairs_given():
+    # No pair here has its swapped pair in the input, a zero or equal operands, so no instance collapses.
+    for pairs in ([(5, 2), (7, 3)], [(2, 5)], [(4, 9), (9, 7)]):
+        assert corpus(pairs, True) == corpus(pairs, False)
+
+
+def test_canonical_sample_of_pairs():
+    # Operands from 2 up, so that no instance collapses because of a zero, a one or equal operands.
+    pairs = [(a, b) for a, b in mc.iter_unique_number_pairs(30, 2, 40, rng=mc.CounterRandom(0, "pairs")) if a != b]
+    assert not any((b, a) in pairs for a, b in pairs if a != b)
+    assert corpus(pairs, True) == corpus(pairs, False)
+
+
+def test_canonical_drops_phrasings_on_a_symmetric_grid():
+    grid = [(a, b) for a in range(7) for b in range(7)]
+    plain, canonical = corpus(grid, False), corpus(grid, True)
+    # Collapsed instances no longer contribute their other phrasings, and skipped templates shift later draws.
+    assert len(canonical) < len(plain)
+    assert canonical - plain
+    generated = len(list(mc.iter_documents(range(0), grid, seed=3, canonical=True)))
+    assert generated < len(list(mc.iter_documents(range(0), grid, seed=3)))
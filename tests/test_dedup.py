@@ -0,0 +1,36 @@
+import pytest
+
+import disk_dedup
+import math_curriculum as mc
+from disk_dedup import DiskDedup
+
+
+def test_fingerprint_dedup_warns_once_when_full():
+    dedup = mc.FingerprintDedup(capacity=8)
+    with pytest.warns(RuntimeWarning, match="full") as record:
+        assert all(dedup.add(str(i)) for i in range(20))
+    assert len(record) == 1
+    assert (dedup.size, dedup.num_overflowed) == (6, 14)
+    assert not dedup.add("0")
+
+
+def test_fingerprint_dedup_memory_budget():
+    assert mc.FingerprintDedup(memory_budget=1 << 20).capacity == 1 << 17
+    assert mc.FingerprintDedup(memory_budget=(1 << 20) - 1).capacity == 1 << 16
+
+
+@pytest.mark.parametrize("fingerprint_bits", [None, 64])
+def test_disk_dedup_repartitions_to_match_set(tmp_path, monkeypatch, fingerprint_bits):
+    salts = []
+    partition = disk_dedup.partition
+    monkeypatch.setattr(disk_dedup, "partition", lambda *args, **kwargs: salts.append(kwargs.get("salt", 0))
+                        or partition(*args, **kwargs))
+    docs = [f"document {i % 3000} " + "x" * (i % 17) for i in range(20_000)]
+    # A budget far below the data forces every bucket to be re-partitioned.
+    dedup = DiskDedup(str(tmp_path), memory_budget=4096, num_buckets=4, fingerprint_bits=fingerprint_bits, workers=1)
+    unique = list(dedup(docs))
+    assert max(salts) > 0
+    assert len(unique) == len(set(unique))
+    assert set(unique) == set(docs)
+    assert dedup.num_duplicates == len(docs) - len(set(docs))
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,14 @@
+import pytest
+
+import math_curriculum as mc
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 17, 255, 256, 257, 1000, 4097, 10007])
+def test_keyed_permutation_is_a_bijection(size):
+    for key in (0, 1, 12345):
+        permutation = mc.KeyedPermutation(size, key)
+        assert sorted(permutation(i) for i in range(size)) == list(range(size))
+
+
+def test_keyed_permutation_depends_on_key():
+    assert [mc.KeyedPermutation(1000, 0)(i) for i in range(20)] != [mc.KeyedPermutation(1000, 1)(i) for i in range(20)]
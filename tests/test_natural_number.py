@@ -0,0 +1,16 @@
+import math_curriculum as mc
+
+
+def test_power_table_stays_within_the_int_str_limit():
+    docs = mc.examples_from_natural_number(10 ** 300, max_digits=10_000)
+    assert any("e+" in doc for doc in docs)
+
+
+def test_huge_numbers_keep_their_exact_statements():
+    n = (1 << 1279) - 1  # A Mersenne prime too large for a float
+    docs = mc.natural_number_examples(n, max_power=3)
+    assert f"|{-n}| = {n}" in docs
+    assert f"{n} is a prime number." in docs
+    assert any(f"has a diameter of {2 * n}." in doc or f"has a diameter equal to {2 * n}." in doc for doc in docs)
+    assert any(f"has an area of {n ** 2}." in doc or f"has an area equal to {n ** 2}." in doc for doc in docs)
+    assert not any("inf" in doc or doc.endswith("≈ 1") for doc in docs)
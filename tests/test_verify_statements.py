@@ -0,0 +1,81 @@
+import pytest
+
+from verify_statements import check_statement
+
+CORRECT = [
+    "12 + 7 = 19",
+    "-8 - 7 = -15",
+    "7 ÷ 9 ≈ 0.7777777777777778",
+    "9² = 81",
+    "17 % 5 = 2",
+    "⁶⁄₈ = ³⁄₄",
+    "3²⁄₅ = 3.4",
+    "φ(12) = 4",
+    "In Euclidean space, a circle with a radius of 3 has a circumference approximately equal to 18.84955592153876.",
+    "In Euclidean space, a circle with a radius of 3 has a diameter equal to 6.",
+    "In Euclidean space, a circle with a radius of 3 has a circumference of 6 * π.",
+    "In Euclidean space, a circle with a radius of 3 has an area roughly equal to 28.274333882308138.",
+    "In Euclidean space, a circle with a radius of 3 has an area equal to 9 × π.",
+    "In Euclidean space, a sphere with a radius of 3 has a surface area approximately equal to 113.09733552923255.",
+    "In Euclidean space, a sphere with a radius of 3 has a surface area of 36π.",
+    "In Euclidean space, a cube with an edge length of 3 has six faces, each with an area of 9.",
+    "In Euclidean space, a rectangle with a width of 3 and a height of 4 has an area equal to 12.",
+    "In Euclidean space, a circle with a radius of 3 has an area of 9π.",
+    "In Euclidean space, a square with an edge length of 4 has an area equal to 16.",
+    "In Euclidean space, a square with an area of 4² has an edge length of 4.",
+    "In Euclidean space, a sphere with a radius of 3 has a volume of 36π.",
+    "In Euclidean space, a sphere with a radius of 1 has a volume approximately equal to 4.1887902047863905.",
+    "In Euclidean space, a cube with an edge length of 3 has a volume of 27.",
+    "In Euclidean space, a rectangle with a width of 3 and a height of 4 has a perimeter of 14.",
+    "In Euclidean space, a triangle with a base of 3 and a height of 5 has an area of 7.5.",
+]
+
+WRONG = [
+    "12 + 7 = 20",
+    "-8 - 7 = -1",
+    "7 ÷ 9 ≈ 0.78",
+    "9² = 18",
+    "17 % 5 = 3",
+    "⁶⁄₈ = ²⁄₃",
+    "3²⁄₅ = 3.25",
+    "φ(12) = 6",
+    "In Euclidean space, a circle with a radius of 3 has a circumference approximately equal to 9.42477796076938.",
+    "In Euclidean space, a circle with a radius of 3 has a diameter equal to 9.",
+    "In Euclidean space, a circle with a radius of 3 has a circumference of 3 * π.",
+    "In Euclidean space, a circle with a radius of 3 has an area roughly equal to 18.84955592153876.",
+    "In Euclidean space, a circle with a radius of 3 has an area equal to 6 × π.",
+    "In Euclidean space, a sphere with a radius of 3 has a surface area approximately equal to 28.274333882308138.",
+    "In Euclidean space, a sphere with a radius of 3 has a surface area of 9π.",
+    "In Euclidean space, a cube with an edge length of 3 has six faces, each with an area of 6.",
+    "In Euclidean space, a rectangle with a width of 3 and a height of 4 has an area equal to 7.",
+    "In Euclidean space, a circle with a radius of 3 has an area of 6π.",
+    "In Euclidean space, a square with an edge length of 4 has an area equal to 8.",
+    "In Euclidean space, a square with an area of 4² has an edge length of 2.",
+    "In Euclidean space, a sphere with a radius of 3 has a volume of 27π.",
+    "In Euclidean space, a sphere with a radius of 1 has a volume approximately equal to 4.18879.",
+    "In Euclidean space, a cube with an edge length of 3 has a volume of 9.",
+    "In Euclidean space, a rectangle with a width of 3 and a height of 4 has a perimeter of 7.",
+    "In Euclidean space, a triangle with a base of 3 and a height of 5 has an area of 15.",
+]
+
+
+@pytest.mark.parametrize("doc", CORRECT)
+def test_correct_statements_pass(doc):
+    assert check_statement(doc) is True
+
+
+@pytest.mark.parametrize("doc", WRONG)
+def test_wrong_statements_fail(doc):
+    assert check_statement(doc) is False
+
+
+@pytest.mark.parametrize("doc", [
+    "1 and 7 are the only divisors of 7.",
+    "In Euclidean space, sum of the interior angles of any triangle is always equal to 180°.",
+])
+def test_other_statements_are_skipped(doc):
+    assert check_statement(doc) is None
+
+
+def test_division_by_zero_fails():
+    assert check_statement("5 / 0 = 0") is False
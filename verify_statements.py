@@ -0,0 +1,419 @@
+"""
+Check that generated statements are mathematically correct. Equations ("12 + 7 = 19", "7 ÷ 9 ≈ 0.7777777777777778",
+"9² = 81", "17 % 5 = 2", "⁶⁄₈ = ³⁄₄", "3²⁄₅ = 3.4", "φ(12) = 4") and a few geometry statements are re-evaluated with
+exact rational arithmetic; "=" must hold exactly and "≈" to a relative tolerance.
+"""
+import itertools
+import json
+import math
+import os
+import re
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+
+# Placeholders a statement's numbers are replaced with in its shape: decimal, superscript and subscript numbers.
+NUMBER, SUPERSCRIPT, SUBSCRIPT = "\x01", "\x02", "\x03"
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?(?:e[+-]\d+)?")
+SUPERSCRIPT_RE = re.compile(r"[⁻⁰¹²³⁴⁵⁶⁷⁸⁹]+")
+SUBSCRIPT_RE = re.compile(r"[₋₀₁₂₃₄₅₆₇₈₉]+")
+LITERAL_RE = re.compile("|".join(pattern.pattern for pattern in (NUMBER_RE, SUPERSCRIPT_RE, SUBSCRIPT_RE)))
+TOKEN_RE = re.compile(r"\s*(?:([\x01\x02\x03])|(\d+)|(//|\*\*|[-+*×x·/⁄÷%^()|=≈πφ]))")
+SCRIPT_DIGITS = str.maketrans("⁻⁰¹²³⁴⁵⁶⁷⁸⁹₋₀₁₂₃₄₅₆₇₈₉", "-0123456789-0123456789")
+
+# Powers are only evaluated up to this many bits; larger ones are skipped rather than built.
+MAX_POWER_BITS = 1 << 20
+
+# Prose statements with a checkable value, as (pattern, equation). A pattern is searched for in a statement's shape:
+# {name} matches a number or power expression like 9², and {mul} any multiplication sign. The statement is then
+# checked as the equation, with each {name} replaced by what it matched. Statements without an "=", "≈" or " has "
+# are skipped before their shape is even computed, so every pattern must contain " has ".
+PROSE_RULES = [
+    (r"a circle with a radius of {r} has a circumference (?:approximately|roughly) equal to {x}\.$",
+     "{x} ≈ 2 × π × {r}"),
+    (r"a circle with a radius of {r} has a circumference (?:of|equal to) {k} {mul} π\.$", "{k} = 2 × {r}"),
+    (r"a circle with a radius of {r} has a diameter (?:of|equal to) {d}\.$", "{d} = 2 × {r}"),
+    (r"a circle with a radius of {r} has an area (?:approximately|roughly) equal to {x}\.$", "{x} ≈ π × {r}^2"),
+    (r"a circle with a radius of {r} has an area (?:of|equal to) {k} {mul} π\.$", "{k} = {r}^2"),
+    (r"a circle with a radius of {r} has an area (?:of|equal to) {k}π\.$", "{k} = {r}^2"),
+    (r"a square with an area (?:of|equal to) {a} has an? (?:edge|side) length of {s}\.$", "{a} = {s}^2"),
+    (r"a square with an? (?:edge|side) length of {s} has an area (?:of|equal to) {a}\.$", "{a} = {s}^2"),
+    (r"a sphere with a radius of {r} has a surface area (?:approximately|roughly) equal to {x}\.$",
+     "{x} ≈ 4 × π × {r}^2"),
+    (r"a sphere with a radius of {r} has a surface area (?:of|equal to) {k}π\.$", "{k} = 4 × {r}^2"),
+    (r"a sphere with a radius of {r} has a volume (?:approximately|roughly) equal to {x}\.$",
+     "{x} ≈ 4 × π × {r}^3 / 3"),
+    (r"a sphere with a radius of {r} has a volume (?:of|equal to) {k}π\.$", "{k} = 4 × {r}^3 / 3"),
+    (r"a cube with an edge length of {s} has a volume (?:of|equal to) {v}\.$", "{v} = {s}^3"),
+    (r"a cube with an edge length of {s} has (?:6|six) faces, each with an area (?:of|equal to) {a}\.$",
+     "{a} = {s}^2"),
+    (r"a rectangle with a width of {w} and a height of {h} has a perimeter (?:of|equal to) {p}\.$",
+     "{p} = 2 × ({w} + {h})"),
+    (r"a rectangle with a width of {w} and a height of {h} has an area (?:of|equal to) {a}\.$", "{a} = {w} × {h}"),
+    (r"a triangle with a base of {b} and a height of {h} has an area (?:of|equal to) {a}\.$", "{a} = {b} × {h} / 2"),
+]
+
+
+class VerificationReport:
+    """
+    Counts of statements checked, failed and skipped (not equation-style) per template id, with the first few failing
+    statements of each template. Reports of separate batches are combined with merge.
+    """
+    FIELDS = ("checked", "failed", "skipped")
+    MAX_EXAMPLES = 5
+
+    def __init__(self):
+        self.templates: dict[str, dict[str, int]] = {}
+        self.examples: dict[str, list[str]] = {}
+
+    @property
+    def num_checked(self) -> int:
+        return sum(counts["checked"] for counts in self.templates.values())
+
+    @property
+    def num_failed(self) -> int:
+        return sum(counts["failed"] for counts in self.templates.values())
+
+    @property
+    def num_skipped(self) -> int:
+        return sum(counts["skipped"] for counts in self.templates.values())
+
+    def merge(self, other: "VerificationReport"):
+        for template_id, counts in other.templates.items():
+            mine = self._counters(template_id)
+            for field in self.FIELDS:
+                mine[field] += counts[field]
+        for template_id, examples in other.examples.items():
+            mine = self.examples.setdefault(template_id, [])
+            mine += examples[:self.MAX_EXAMPLES - len(mine)]
+
+    def to_dict(self) -> dict:
+        return {"templates": self.templates, "examples": self.examples}
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def summary(self) -> str:
+        """A line of totals, then a table of the templates with failures, most failures first."""
+        lines = [f"checked {self.num_checked:,} statements, {self.num_failed:,} failed, {self.num_skipped:,} skipped"]
+        failing = sorted((item for item in self.templates.items() if item[1]["failed"]),
+                         key=lambda item: -item[1]["failed"])
+        if failing:
+            lines.append(f"{'template':<20} {'checked':>10} {'failed':>10}  example")
+            for template_id, c in failing:
+                lines.append(f"{template_id:<20} {c['checked']:>10,} {c['failed']:>10,}  "
+                             f"{self.examples[template_id][0]}")
+        return "\n".join(lines)
+
+    def _counters(self, template_id: str) -> dict[str, int]:
+        if (counters := self.templates.get(template_id)) is None:
+            counters = self.templates[template_id] = dict.fromkeys(self.FIELDS, 0)
+        return counters
+
+
+class StatementVerifier:
+    """A pipeline stage that yields (doc, tag) pairs unchanged while checking them in a process pool."""
+
+    def __init__(self, workers: int | None = None, batch_size: int = 4096, rel_tol: float = 1e-9):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.rel_tol = rel_tol
+        self.report = VerificationReport()
+
+    def __call__(self, tagged: Iterable[tuple[str, object]]) -> Iterator[tuple[str, object]]:
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        pending = deque()
+        try:
+            for batch in itertools.batched(tagged, self.batch_size):
+                items = [(doc, tag.template_id) for doc, tag in batch]
+                if executor is None:
+                    self.report.merge(verify_batch(items, self.rel_tol))
+                else:
+                    pending.append(executor.submit(verify_batch, items, self.rel_tol))
+                    if len(pending) > 2 * self.workers:
+                        self.report.merge(pending.popleft().result())
+                yield from batch
+            while pending:
+                self.report.merge(pending.popleft().result())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+
+def check_statement(doc: str, rel_tol: float = 1e-9) -> bool | None:
+    """Whether a statement is correct, or None when it isn't a kind of statement that can be checked."""
+    shape, literals = _split_literals(doc)
+    if (check := _checker(shape)) is None:
+        return None
+    try:
+        return check(literals, Fraction(rel_tol))
+    except _Unverifiable:
+        return None
+    except ZeroDivisionError:
+        return False
+
+
+def verify_batch(items: Sequence[tuple[str, str]], rel_tol: float = 1e-9) -> VerificationReport:
+    """Checks a batch of (statement, template id) pairs and reports on them."""
+    report = VerificationReport()
+    tol = Fraction(rel_tol)
+    for doc, template_id in items:
+        counters = report._counters(template_id)
+        if "=" not in doc and "≈" not in doc and " has " not in doc:
+            counters["skipped"] += 1
+            continue
+        shape, literals = _split_literals(doc)
+        if (check := _checker(shape)) is None:
+            counters["skipped"] += 1
+            continue
+        try:
+            ok = check(literals, tol)
+        except _Unverifiable:
+            counters["skipped"] += 1
+            continue
+        except ZeroDivisionError:
+            ok = False
+        counters["checked"] += 1
+        if not ok:
+            counters["failed"] += 1
+            examples = report.examples.setdefault(template_id, [])
+            if len(examples) < report.MAX_EXAMPLES:
+                examples.append(doc)
+    return report
+
+
+class _Unverifiable(Exception):
+    """Raised by a check when a value is too large to evaluate exactly."""
+
+
+class _Parser:
+    """Translates the tokens of an equation into a Python expression over `x` and `tol`."""
+
+    def __init__(self, tokens: list[tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def statement(self) -> str:
+        lhs = self.expr()
+        relation = self.next()
+        rhs = self.expr()
+        if relation not in (("op", "="), ("op", "≈")) or self.peek() is not None:
+            raise SyntaxError("Not an equation")
+        return f"({lhs}) == ({rhs})" if relation[1] == "=" else f"_close({lhs}, {rhs}, tol)"
+
+    def expr(self) -> str:
+        source = self.term()
+        while self.peek() in (("op", "+"), ("op", "-")):
+            source = f"({source} {self.next()[1]} {self.term()})"
+        return source
+
+    def term(self) -> str:
+        source = self.unary()
+        while (token := self.peek()) is not None and token[0] == "op":
+            match token[1]:
+                case "*" | "×" | "x" | "·":
+                    self.next()
+                    source = f"({source} * {self.unary()})"
+                case "/" | "⁄" | "÷":
+                    self.next()
+                    source = f"_div({source}, {self.unary()})"
+                case "//" | "%":
+                    self.next()
+                    source = f"({source} {token[1]} {self.unary()})"
+                case _:
+                    break
+        return source
+
+    def unary(self) -> str:
+        if self.peek() == ("op", "-"):
+            self.next()
+            return f"(-{self.unary()})"
+        return self.power()
+
+    def power(self) -> str:
+        source = self.postfix()
+        if self.peek() in (("op", "^"), ("op", "**")):
+            self.next()
+            return f"_pow({source}, {self.unary()})"
+        return source
+
+    def postfix(self) -> str:
+        source = self.primary()
+        while True:
+            token = self.peek()
+            if token is not None and token[0] == SUPERSCRIPT and not self.at_fraction():
+                self.next()
+                source = f"_pow({source}, {self.literal(token)})"
+            elif token == ("op", "%") and not self.at_operand(self.pos + 1):
+                self.next()
+                source = f"_div({source}, 100)"
+            else:
+                return source
+
+    def primary(self) -> str:
+        if self.at_fraction():
+            return self.fraction()
+        token = self.next()
+        if token is not None and token[0] in (NUMBER, "const"):
+            if self.at_fraction():
+                return f"_mixed({self.literal(token)}, {self.fraction()})"
+            return self.literal(token)
+        if token == ("op", "("):
+            source = self.expr()
+            if self.next() != ("op", ")"):
+                raise SyntaxError("Unbalanced parentheses")
+            return source
+        if token == ("op", "|"):
+            source = self.expr()
+            if self.next() != ("op", "|"):
+                raise SyntaxError("Unbalanced absolute value")
+            return f"abs({source})"
+        if token == ("op", "π"):
+            return "_PI"
+        if token == ("op", "φ") and self.next() == ("op", "("):
+            source = self.expr()
+            if self.next() != ("op", ")"):
+                raise SyntaxError("Unbalanced parentheses")
+            return f"_totient({source})"
+        raise SyntaxError(f"Unexpected token {token!r}")
+
+    def fraction(self) -> str:
+        numerator, _, denominator = self.next(), self.next(), self.next()
+        return f"_div({self.literal(numerator)}, {self.literal(denominator)})"
+
+    def literal(self, token: tuple[str, str]) -> str:
+        kind, value = token
+        if kind == "const":
+            return value
+        return f"{'_num' if kind == NUMBER else '_script'}(x[{value}])"
+
+    def at_fraction(self) -> bool:
+        """Whether the next tokens are a superscript over a subscript, like ³⁄₄."""
+        return (self.peek(0) is not None and self.peek(0)[0] == SUPERSCRIPT and self.peek(1) == ("op", "⁄")
+                and self.peek(2) is not None and self.peek(2)[0] == SUBSCRIPT)
+
+    def at_operand(self, pos: int) -> bool:
+        token = self.tokens[pos] if pos < len(self.tokens) else None
+        return token is not None and (token[0] in (NUMBER, SUPERSCRIPT, "const") or token[1] in ("(", "π"))
+
+    def peek(self, ahead: int = 0) -> tuple[str, str] | None:
+        pos = self.pos + ahead
+        return self.tokens[pos] if pos < len(self.tokens) else None
+
+    def next(self) -> tuple[str, str] | None:
+        token = self.peek()
+        self.pos += 1
+        return token
+
+
+_checks: dict[str, Callable[[list[str], Fraction], bool] | None] = {}  # Shape -> compiled check, None if uncheckable
+_MAX_CHECKS = 1 << 16
+_PI = Fraction(math.pi)
+_NAMESPACE = {
+    "_PI": _PI,
+    "_close": lambda a, b, tol: abs(a - b) <= tol * max(abs(a), abs(b)),
+    "_div": lambda a, b: Fraction(a) / b,
+    "_mixed": lambda whole, fraction: whole + fraction if whole >= 0 else whole - fraction,
+    "_num": lambda s: int(s) if s.isdigit() else Fraction(s),
+    "_pow": lambda base, exponent: _pow(base, exponent),  # _pow and _totient are defined below
+    "_script": lambda s: int(s.translate(SCRIPT_DIGITS)),
+    "_totient": lambda n: _totient(n),
+}
+_PROSE_RULES = [
+    (re.compile(re.sub(r"\{(\w+)}", lambda m: r"(?:\*|×|x|·)" if m[1] == "mul" else rf"(?P<{m[1]}>[\x01-\x03^*]+)",
+                       pattern)), equation)
+    for pattern, equation in PROSE_RULES
+]
+
+
+def _checker(shape: str) -> Callable[[list[str], Fraction], bool] | None:
+    if shape not in _checks:
+        if len(_checks) >= _MAX_CHECKS:
+            _checks.clear()
+        _checks[shape] = _compile_check(shape)
+    return _checks[shape]
+
+
+def _compile_check(shape: str) -> Callable[[list[str], Fraction], bool] | None:
+    """Compiles the check for every statement of one shape, or returns None if they aren't checkable."""
+    for pattern, equation in _PROSE_RULES:
+        if match := pattern.search(shape):
+            tokens = []
+            for literal, name in re.findall(r"([^{]*)(?:\{(\w+)}|$)", equation):
+                tokens += _tokenize(literal, 0)
+                if name:
+                    # Parenthesized, and numbered by position in the whole statement
+                    start = match.start(name)
+                    offset = sum(shape.count(c, 0, start) for c in (NUMBER, SUPERSCRIPT, SUBSCRIPT))
+                    tokens += [("op", "(")] + _tokenize(match[name], offset) + [("op", ")")]
+            break
+    else:
+        if "=" not in shape and "≈" not in shape:
+            return None
+        tokens = _tokenize(shape, 0)
+    if tokens is None:
+        return None
+    try:
+        source = _Parser(tokens).statement()
+    except SyntaxError:
+        return None
+    return eval(f"lambda x, tol: {source}", _NAMESPACE)
+
+
+def _pow(base: int | Fraction, exponent: int | Fraction) -> Fraction:
+    if isinstance(exponent, Fraction):
+        if exponent.denominator != 1:
+            raise _Unverifiable("Non-integer exponent")
+        exponent = exponent.numerator
+    base = Fraction(base)
+    if (base.numerator.bit_length() + base.denominator.bit_length()) * abs(exponent) > MAX_POWER_BITS:
+        raise _Unverifiable("Power too large to evaluate exactly")
+    return base ** exponent
+
+
+def _split_literals(doc: str) -> tuple[str, list[str]]:
+    """Returns (shape, numbers): the statement with its numbers replaced by placeholders, and the numbers in order."""
+    shape = SUBSCRIPT_RE.sub(SUBSCRIPT, SUPERSCRIPT_RE.sub(SUPERSCRIPT, NUMBER_RE.sub(NUMBER, doc)))
+    return shape, LITERAL_RE.findall(doc)
+
+
+def _tokenize(text: str, offset: int) -> list[tuple[str, str]] | None:
+    """Tokens of an equation shape, numbering its placeholders from `offset`; None if it has anything else in it."""
+    tokens = []
+    pos = 0
+    end = len(text.rstrip())
+    while pos < end:
+        if (match := TOKEN_RE.match(text, pos)) is None:
+            return None
+        placeholder, const, op = match.groups()
+        if placeholder:
+            tokens.append((placeholder, str(offset)))
+            offset += 1
+        elif const:
+            tokens.append(("const", const))
+        else:
+            tokens.append(("op", op))
+        pos = match.end()
+    return tokens
+
+
+def _totient(n: int | Fraction) -> int:
+    """Euler's totient by trial division, which is quick for the numbers number_theory statements are about."""
+    if isinstance(n, Fraction) and n.denominator != 1 or n < 1:
+        raise _Unverifiable("Totient of a non-positive or non-integer number")
+    n = int(n)
+    if n.bit_length() > 40:
+        raise _Unverifiable("Too large to factor by trial division")
+    result = n
+    p = 2
+    while p * p <= n:
+        if n % p == 0:
+            while n % p == 0:
+                n //= p
+            result -= result // p
+        p += 1
+    if n > 1:
+        result -= result // n
+    return result